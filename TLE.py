@@ -1,14 +1,111 @@
+import os
+import hashlib
+import threading
 import requests
-from sgp4.api import Satrec
+import numpy as np
+from sgp4.api import Satrec, SatrecArray, jday
+from sgp4.conveniences import sat_epoch_datetime
 from astropy.coordinates import TEME, ITRS, CartesianRepresentation, EarthLocation
 from astropy.time import Time as AstroPyTime
 from astropy import units as u
 from datetime import datetime
 from numpy import rad2deg
 from loguru import logger
+from functools import lru_cache
+from collections import OrderedDict
+
+from metrics import timed
 
 TLE_URL = "https://celestrak.org/NORAD/elements/gp.php?GROUP=active&FORMAT=tle"
 
+# "fast" - векторизованное ядро на NumPy, "astropy" - эталонная реализация
+FRAMES_MODE = os.getenv("TLE_FRAMES", "fast")
+
+# WGS84 ellipsoid
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+# Maximum ITRS position difference between the fast kernel and astropy
+FAST_FRAMES_MAX_ERROR_KM = 0.001
+
+# Polar motion (xp, yp) in radians outside the IERS table: the 50-year mean astropy uses there
+DEFAULT_POLAR_MOTION = (0.035 * np.pi / (180 * 3600), 0.29 * np.pi / (180 * 3600))
+
+SATELLITE_CACHE_SIZE = int(os.getenv("TLE_CACHE_SIZE", "20000"))
+
+
+class SatelliteCache:
+    """Process-wide LRU cache of parsed Satrec objects and derived orbital elements.
+
+    Entries are keyed by NORAD ID, TLE epoch and a hash of both lines, so a new
+    element set never hits a stale entry; ``invalidate`` drops old ones early.
+    """
+
+    def __init__(self, max_size=SATELLITE_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys_by_norad_id = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tle_line1, tle_line2):
+        norad_id = tle_line1[2:7].strip()
+        epoch = tle_line1[18:32].strip()
+        digest = hashlib.blake2b(f"{tle_line1}\n{tle_line2}".encode(), digest_size=8).hexdigest()
+        return norad_id, epoch, digest
+
+    def get(self, tle_line1, tle_line2):
+        """Return (satrec, orbital_parameters) for the TLE, parsing it on a miss."""
+        key = self.key(tle_line1, tle_line2)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        sat = Satrec.twoline2rv(tle_line1, tle_line2)
+        entry = (sat, _orbital_parameters(sat))
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = entry
+            self._keys_by_norad_id.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._forget(self._entries.popitem(last=False)[0])
+        return entry
+
+    def invalidate(self, norad_id):
+        """Drop every cached element set of the satellite."""
+        with self._lock:
+            for key in self._keys_by_norad_id.pop(str(norad_id).strip(), ()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_norad_id.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _forget(self, key):
+        keys = self._keys_by_norad_id.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_norad_id[key[0]]
+
+
+satellite_cache = SatelliteCache()
+
 def fetch_tle_from_source():
     """Fetch TLE data from CelesTrak."""
     try:
@@ -23,7 +120,7 @@ def fetch_tle_from_source():
 def process_tle_data(tle_data):
     """Process TLE data into satellite entries."""
     satellites = []
-    for i in range(0, len(tle_data), 3):
+    for i in range(0, len(tle_data) - 2, 3):
         satellite_name = tle_data[i].strip()
         line1 = tle_data[i + 1].strip()
         line2 = tle_data[i + 2].strip()
@@ -34,13 +131,37 @@ def process_tle_data(tle_data):
         })
     return satellites
 
+def tle_elements(tle_line1, tle_line2):
+    """Mean elements and derived orbit geometry stored with each satellite at ingest.
+
+    Semi-major axis follows ``_orbital_parameters``; apogee and perigee are
+    altitudes above the WGS84 equatorial radius.
+    """
+    sat = Satrec.twoline2rv(tle_line1, tle_line2)
+    params = _orbital_parameters(sat)
+    semi_major_axis = params["semi_major_axis_km"]
+    return {
+        "epoch": sat_epoch_datetime(sat).replace(tzinfo=None),
+        "mean_motion_rev_day": sat.no_kozai * 1440 / (2 * np.pi),
+        "period_min": 2 * np.pi / sat.no_kozai,
+        "semi_major_axis_km": semi_major_axis,
+        "apogee_km": semi_major_axis * (1 + sat.ecco) - WGS84_A_KM,
+        "perigee_km": semi_major_axis * (1 - sat.ecco) - WGS84_A_KM,
+        "inclination_deg": float(params["inclination_deg"]),
+        "eccentricity": sat.ecco,
+        "raan_deg": float(params["right_ascension_deg"]),
+    }
+
 def get_orbital_parameters(tle_line1, tle_line2):
     """Calculate orbital parameters from TLE data."""
-    sat = Satrec.twoline2rv(tle_line1, tle_line2)
+    return dict(satellite_cache.get(tle_line1, tle_line2)[1])
+
+def _orbital_parameters(sat):
+    """Calculate orbital parameters from a parsed Satrec."""
     # Calculate semi-major axis in km
     mu = 398600.4418  # Earth's gravitational parameter in km^3/s^2
-    n = sat.no_kozai / 60.0  # Mean motion in revs per second
-    semi_major_axis = (mu / (n * 2 * 3.14159265359) ** 2) ** (1 / 3)
+    n = sat.no_kozai / 60.0  # Mean motion in rad per second
+    semi_major_axis = (mu / n ** 2) ** (1 / 3)
 
     params = {
         "semi_major_axis_km": semi_major_axis,
@@ -52,71 +173,315 @@ def get_orbital_parameters(tle_line1, tle_line2):
     }
     return params
 
-def get_satellite_position_xyz(tle_line1, tle_line2, current_time=None):
-    """Get satellite position in XYZ coordinates (ITRS) for the given time."""
-    sat = Satrec.twoline2rv(tle_line1, tle_line2)
-
-    if current_time is None:
-        current_time = datetime.utcnow()
+def _to_datetime(current_time):
+    return datetime.utcnow() if current_time is None else current_time
 
-    astro_time = AstroPyTime(current_time, scale="utc")
-    jd, fr = astro_time.jd1, astro_time.jd2
+def _propagate_one(sat, current_time, frames=None):
+    """Run SGP4 once for one satellite and transform the state to ITRS/geodetic."""
+    jd, fr = julian_dates([_to_datetime(current_time)])
 
-    error_code, teme_position, teme_velocity = sat.sgp4(jd, fr)
+    with timed("sgp4", 1):
+        error_code, teme_position, teme_velocity = sat.sgp4(jd[0], fr[0])
     if error_code != 0:
         raise ValueError(f"SGP4 error code: {error_code}")
 
-    teme_coords = TEME(CartesianRepresentation(teme_position * u.km), obstime=astro_time)
-    itrs_coords = teme_coords.transform_to(ITRS(obstime=astro_time)).cartesian.xyz
+    return teme_to_itrs(np.array(teme_position).reshape(1, 1, 3), jd, fr, frames)
+
+def get_satellite_position_xyz(tle_line1, tle_line2, current_time=None, frames=None):
+    """Get satellite position in XYZ coordinates (ITRS) for the given time."""
+    sat, _ = satellite_cache.get(tle_line1, tle_line2)
+    itrs = _propagate_one(sat, current_time, frames)["xyz_km"]
 
     return {
-        "x_km": itrs_coords[0].value,
-        "y_km": itrs_coords[1].value,
-        "z_km": itrs_coords[2].value,
+        "x_km": itrs[0, 0, 0],
+        "y_km": itrs[0, 0, 1],
+        "z_km": itrs[0, 0, 2],
     }
 
-def get_lat_lon_alt(tle_line1, tle_line2, current_time=None):
+def get_lat_lon_alt(tle_line1, tle_line2, current_time=None, frames=None):
     """Get satellite latitude, longitude, and altitude for the given time."""
-    sat = Satrec.twoline2rv(tle_line1, tle_line2)
-
-    if current_time is None:
-        current_time = datetime.utcnow()
-
-    astro_time = AstroPyTime(current_time, scale="utc")
-    jd, fr = astro_time.jd1, astro_time.jd2
-
-    error_code, teme_position, teme_velocity = sat.sgp4(jd, fr)
-    if error_code != 0:
-        raise ValueError(f"SGP4 error code: {error_code}")
-
-    teme_coords = TEME(CartesianRepresentation(teme_position * u.km), obstime=astro_time)
-    itrs_coords = teme_coords.transform_to(ITRS(obstime=astro_time)).cartesian.xyz
-
-    earth_location = EarthLocation(x=itrs_coords[0], y=itrs_coords[1], z=itrs_coords[2])
-    geodetic_location = earth_location.to_geodetic()
+    sat, _ = satellite_cache.get(tle_line1, tle_line2)
+    geodetic = _propagate_one(sat, current_time, frames)
 
     return {
-        "latitude_deg": geodetic_location.lat.deg,
-        "longitude_deg": geodetic_location.lon.deg,
-        "altitude_km": geodetic_location.height.to(u.km).value,
+        "latitude_deg": geodetic["latitude_deg"][0, 0],
+        "longitude_deg": geodetic["longitude_deg"][0, 0],
+        "altitude_km": geodetic["altitude_km"][0, 0],
     }
 
 def get_orbit_and_position(tle_line1, tle_line2, current_time=None):
     """Get both orbital parameters and current position of the satellite."""
     try:
-        orbital_params = get_orbital_parameters(tle_line1, tle_line2)
-        position_xyz = get_satellite_position_xyz(tle_line1, tle_line2, current_time)
-        lat_lon_alt = get_lat_lon_alt(tle_line1, tle_line2, current_time)
+        with timed("tle_parse", 1):
+            sat, orbital_params = satellite_cache.get(tle_line1, tle_line2)
+        # Один прогон SGP4: xyz и широта/долгота/высота из одного вектора состояния
+        state = _propagate_one(sat, current_time)
 
         return {
             "position": {
-                "x": position_xyz["x_km"],
-                "y": position_xyz["y_km"],
-                "z": position_xyz["z_km"]
+                "x": state["xyz_km"][0, 0, 0],
+                "y": state["xyz_km"][0, 0, 1],
+                "z": state["xyz_km"][0, 0, 2]
             },
-            "orbital_parameters": orbital_params,
-            "current_lat_lon_alt": lat_lon_alt
+            "orbital_parameters": dict(orbital_params),
+            "current_lat_lon_alt": {
+                "latitude_deg": state["latitude_deg"][0, 0],
+                "longitude_deg": state["longitude_deg"][0, 0],
+                "altitude_km": state["altitude_km"][0, 0],
+            }
         }
     except Exception as e:
         logger.error(f"Error calculating orbit data: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def julian_dates(times):
+    """Convert a sequence of UTC datetimes into SGP4 jd/fr arrays."""
+    jd, fr = zip(*(
+        jday(t.year, t.month, t.day, t.hour, t.minute, t.second + t.microsecond * 1e-6)
+        for t in times
+    ))
+    return np.array(jd), np.array(fr)
+
+def sample_count(start, stop, step_seconds):
+    """Number of points of the grid from start to stop inclusive with the given step."""
+    return int(np.floor((stop - start).total_seconds() / step_seconds)) + 1
+
+def julian_date_range(start, stop, step_seconds):
+    """Build jd/fr arrays for an evenly spaced time grid from start to stop inclusive."""
+    count = sample_count(start, stop, step_seconds)
+    jd, fr = julian_dates([start])
+    return np.full(count, jd[0]), fr[0] + np.arange(count) * (step_seconds / 86400.0)
+
+def propagate_batch(tle_pairs, times=None, jd=None, fr=None):
+    """Propagate N satellites over M timestamps in one vectorized SGP4 call.
+
+    Epochs are given either as UTC datetimes in ``times`` or as ready ``jd``/``fr``
+    arrays. Returns columnar arrays: ``error`` (N, M), TEME ``position`` in km and
+    ``velocity`` in km/s (N, M, 3), the cached ``satrecs`` with their
+    ``orbital_parameters`` and the ``jd``/``fr`` epochs they were propagated to.
+    """
+    with timed("tle_parse", len(tle_pairs)):
+        entries = [satellite_cache.get(line1, line2) for line1, line2 in tle_pairs]
+    satrecs = [sat for sat, _ in entries]
+    if times is not None:
+        jd, fr = julian_dates(times)
+    if satrecs:
+        with timed("sgp4", len(satrecs) * len(jd)):
+            error, position, velocity = SatrecArray(satrecs).sgp4(jd, fr)
+    else:
+        error = np.zeros((0, len(jd)), dtype=np.uint8)
+        position = np.zeros((0, len(jd), 3))
+        velocity = np.zeros((0, len(jd), 3))
+
+    return {
+        "satrecs": satrecs,
+        "orbital_parameters": [params for _, params in entries],
+        "jd": jd,
+        "fr": fr,
+        "error": error,
+        "position": position,
+        "velocity": velocity,
+    }
+
+def propagate_points(satrecs, index, jd, fr):
+    """TEME position (km) and velocity (km/s) of ``satrecs[index[k]]`` at ``jd[k] + fr[k]``.
+
+    Points are grouped by satellite, so the cost is one array-valued SGP4 call
+    per distinct satellite. Points SGP4 could not propagate are NaN.
+    """
+    position = np.full((len(index), 3), np.nan)
+    velocity = np.full((len(index), 3), np.nan)
+    order = np.argsort(index, kind="stable")
+    satellites, starts = np.unique(index[order], return_index=True)
+    bounds = np.append(starts, len(order))
+    for sat_index, lo, hi in zip(satellites, bounds[:-1], bounds[1:]):
+        points = order[lo:hi]
+        error, r, v = satrecs[sat_index].sgp4_array(jd[points], fr[points])
+        position[points] = np.where((error == 0)[:, None], r, np.nan)
+        velocity[points] = np.where((error == 0)[:, None], v, np.nan)
+    return position, velocity
+
+def get_ephemeris(tle_pairs, start, stop, step_seconds):
+    """Propagate satellites over an evenly spaced time grid.
+
+    Returns the sample ``offsets_s`` from ``start`` and (N, M) columnar arrays:
+    ``error``, ITRS ``xyz_km`` (N, M, 3), ``latitude_deg``, ``longitude_deg``
+    and ``altitude_km``.
+    """
+    jd, fr = julian_date_range(start, stop, step_seconds)
+    batch = propagate_batch(tle_pairs, jd=jd, fr=fr)
+    frames = teme_to_itrs(batch["position"], jd, fr)
+
+    return {
+        "offsets_s": np.arange(len(jd)) * step_seconds,
+        "error": batch["error"],
+        **frames,
+    }
+
+def teme_to_itrs(teme_position, jd, fr, frames=None):
+    """Transform (N, M, 3) TEME positions in km to ITRS xyz and geodetic arrays.
+
+    ``frames`` selects the implementation: "fast" (NumPy kernel) or "astropy"
+    (reference). Defaults to ``FRAMES_MODE``.
+    """
+    frames = frames or FRAMES_MODE
+    if frames not in ("fast", "astropy"):
+        raise ValueError(f"Unknown frames mode: {frames}")
+
+    with timed(f"frames_{frames}", int(np.prod(teme_position.shape[:-1]))):
+        if frames == "astropy":
+            return teme_to_itrs_astropy(teme_position, jd, fr)
+        xyz = teme_to_itrs_fast(teme_position, jd, fr)
+        latitude, longitude, altitude = itrs_to_geodetic(xyz)
+    return {
+        "xyz_km": xyz,
+        "latitude_deg": latitude,
+        "longitude_deg": longitude,
+        "altitude_km": altitude,
+    }
+
+def teme_to_itrs_astropy(teme_position, jd, fr):
+    """Reference TEME -> ITRS -> geodetic transform through astropy frames."""
+    astro_time = AstroPyTime(jd, fr, format="jd", scale="utc")
+    teme_coords = TEME(
+        CartesianRepresentation(np.moveaxis(teme_position, -1, 0) * u.km),
+        obstime=astro_time
+    )
+    itrs_coords = teme_coords.transform_to(ITRS(obstime=astro_time)).cartesian.xyz
+    geodetic_location = EarthLocation(
+        x=itrs_coords[0], y=itrs_coords[1], z=itrs_coords[2]
+    ).to_geodetic()
+
+    return {
+        "xyz_km": np.moveaxis(itrs_coords.to(u.km).value, 0, -1),
+        "latitude_deg": geodetic_location.lat.deg,
+        "longitude_deg": geodetic_location.lon.deg,
+        "altitude_km": geodetic_location.height.to(u.km).value,
+    }
+
+@lru_cache(maxsize=1)
+def _earth_orientation_table():
+    """Load the IERS table once as plain NumPy columns (MJD, UT1-UTC s, xp/yp rad)."""
+    try:
+        from astropy.utils import iers
+        table = iers.earth_orientation_table.get()
+        arcsec = np.pi / (180 * 3600)
+        return (
+            np.asarray(table["MJD"].value),
+            np.asarray(table["UT1_UTC"].value),
+            np.asarray(table["PM_x"].value) * arcsec,
+            np.asarray(table["PM_y"].value) * arcsec,
+        )
+    except Exception as e:
+        logger.warning(f"IERS table unavailable, fast frames run without EOP: {e}")
+        zero = np.zeros(1)
+        return zero, zero, zero, zero
+
+def _earth_orientation(jd, fr):
+    """Interpolate UT1-UTC and polar motion for the given UTC epochs.
+
+    Outside the IERS table this follows astropy: UT1-UTC keeps the edge
+    value, polar motion falls back to the 50-year mean ``DEFAULT_POLAR_MOTION``.
+    """
+    mjd, ut1_utc, pm_x, pm_y = _earth_orientation_table()
+    epoch_mjd = (jd - 2400000.5) + fr
+    # Как searchsorted(side="right") в astropy: последняя строка таблицы уже вне диапазона
+    outside = (epoch_mjd < mjd[0]) | (epoch_mjd >= mjd[-1])
+    return (
+        np.interp(epoch_mjd, mjd, ut1_utc),
+        np.where(outside, DEFAULT_POLAR_MOTION[0], np.interp(epoch_mjd, mjd, pm_x)),
+        np.where(outside, DEFAULT_POLAR_MOTION[1], np.interp(epoch_mjd, mjd, pm_y)),
+    )
+
+def _gmst82(jd_ut1, fr_ut1):
+    """Greenwich mean sidereal time, IAU 1982 model (as erfa.gmst82), in radians."""
+    t = ((jd_ut1 - 2451545.0) + fr_ut1) / 36525.0
+    day_fraction = np.fmod(jd_ut1, 1.0) + np.fmod(fr_ut1, 1.0)
+    gmst_seconds = (
+        24110.54841 - 43200.0
+        + (8640184.812866 + (0.093104 - 6.2e-6 * t) * t) * t
+        + 86400.0 * day_fraction
+    )
+    return np.mod(gmst_seconds * (2 * np.pi / 86400.0), 2 * np.pi)
+
+def teme_to_itrs_fast(teme_position, jd, fr):
+    """Vectorized TEME -> ITRS rotation (GMST82 + polar motion) for (N, M, 3) km arrays."""
+    dut1, xp, yp = _earth_orientation(jd, fr)
+    gmst = _gmst82(jd, fr + dut1 / 86400.0)
+
+    cos_g, sin_g = np.cos(gmst), np.sin(gmst)
+    x, y, z = teme_position[..., 0], teme_position[..., 1], teme_position[..., 2]
+    # Earth rotation into the pseudo Earth-fixed frame
+    x_pef = cos_g * x + sin_g * y
+    y_pef = -sin_g * x + cos_g * y
+
+    # Polar motion W = Rx(-yp) Ry(-xp), TIO locator s' is below 0.1 mas and ignored
+    cos_x, sin_x = np.cos(xp), np.sin(xp)
+    cos_y, sin_y = np.cos(yp), np.sin(yp)
+    return np.stack([
+        cos_x * x_pef + sin_x * z,
+        sin_x * sin_y * x_pef + cos_y * y_pef - sin_y * cos_x * z,
+        -sin_x * cos_y * x_pef + sin_y * y_pef + cos_x * cos_y * z,
+    ], axis=-1)
+
+def itrs_to_geodetic(xyz_km, iterations=4):
+    """Vectorized WGS84 geodetic latitude/longitude in degrees and altitude in km."""
+    x, y, z = xyz_km[..., 0], xyz_km[..., 1], xyz_km[..., 2]
+    p = np.hypot(x, y)
+    longitude = np.arctan2(y, x)
+
+    latitude = np.arctan2(z, p * (1 - WGS84_E2))
+    for _ in range(iterations):
+        sin_lat = np.sin(latitude)
+        n = WGS84_A_KM / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+        altitude = p * np.cos(latitude) + z * sin_lat - WGS84_A_KM ** 2 / n
+        latitude = np.arctan2(z, p * (1 - WGS84_E2 * n / (n + altitude)))
+
+    sin_lat = np.sin(latitude)
+    n = WGS84_A_KM / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    altitude = p * np.cos(latitude) + z * sin_lat - WGS84_A_KM ** 2 / n
+    return rad2deg(latitude), rad2deg(longitude), altitude
+
+def fast_frames_error_km(tle_pairs, times):
+    """Maximum ITRS position difference in km between the fast kernel and astropy.
+
+    Used to check the kernel against ``FAST_FRAMES_MAX_ERROR_KM``.
+    """
+    batch = propagate_batch(tle_pairs, times)
+    valid = batch["error"] == 0
+    fast = teme_to_itrs(batch["position"], batch["jd"], batch["fr"], frames="fast")
+    reference = teme_to_itrs(batch["position"], batch["jd"], batch["fr"], frames="astropy")
+    difference = np.linalg.norm(fast["xyz_km"] - reference["xyz_km"], axis=-1)
+    return float(difference[valid].max()) if valid.any() else 0.0
+
+def get_orbits_and_positions(tle_pairs, current_time=None):
+    """Get orbital parameters and current position for many satellites at once.
+
+    Returns a list aligned with ``tle_pairs``; entries for satellites that
+    SGP4 could not propagate are ``None``.
+    """
+    if not tle_pairs:
+        return []
+
+    batch = propagate_batch(tle_pairs, [_to_datetime(current_time)])
+    frames = teme_to_itrs(batch["position"], batch["jd"], batch["fr"])
+
+    results = []
+    for i, sat in enumerate(batch["satrecs"]):
+        error_code = batch["error"][i, 0]
+        if error_code != 0:
+            logger.error(f"SGP4 error code {error_code} for satellite {sat.satnum}")
+            results.append(None)
+            continue
+
+        x, y, z = frames["xyz_km"][i, 0]
+        results.append({
+            "position": {"x": float(x), "y": float(y), "z": float(z)},
+            "orbital_parameters": dict(batch["orbital_parameters"][i]),
+            "current_lat_lon_alt": {
+                "latitude_deg": float(frames["latitude_deg"][i, 0]),
+                "longitude_deg": float(frames["longitude_deg"][i, 0]),
+                "altitude_km": float(frames["altitude_km"][i, 0]),
+            }
+        })
+    return results
@@ -0,0 +1,39 @@
+"""Add satellite change sequence
+
+Revision ID: 5c1e8d2f4a90
+Revises: a375930e1697
+Create Date: 2025-07-14 18:32:05.217843
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e8d2f4a90'
+down_revision: Union[str, None] = 'a375930e1697'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('satellite_change_seq', schema='satelite')))
+    op.add_column('satellites', sa.Column('change_seq', sa.BigInteger(), nullable=True), schema='satelite')
+    op.add_column('satellites', sa.Column('removed_at', sa.DateTime(), nullable=True), schema='satelite')
+    # Существующие строки нумеруем в порядке обновления
+    op.execute(
+        "UPDATE satelite.satellites AS s SET change_seq = numbered.seq "
+        "FROM (SELECT norad_id, nextval('satelite.satellite_change_seq') AS seq "
+        "      FROM (SELECT norad_id FROM satelite.satellites ORDER BY updated_at, norad_id) AS ordered) AS numbered "
+        "WHERE s.norad_id = numbered.norad_id"
+    )
+    op.create_index(op.f('ix_satelite_satellites_change_seq'), 'satellites', ['change_seq'], unique=False, schema='satelite')
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_satelite_satellites_change_seq'), table_name='satellites', schema='satelite')
+    op.drop_column('satellites', 'removed_at', schema='satelite')
+    op.drop_column('satellites', 'change_seq', schema='satelite')
+    op.execute(sa.schema.DropSequence(sa.Sequence('satellite_change_seq', schema='satelite')))
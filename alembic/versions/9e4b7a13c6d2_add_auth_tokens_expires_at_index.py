@@ -0,0 +1,26 @@
+"""Add auth_tokens expires_at index
+
+Revision ID: 9e4b7a13c6d2
+Revises: 5c1e8d2f4a90
+Create Date: 2025-07-16 11:05:48.603912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b7a13c6d2'
+down_revision: Union[str, None] = '5c1e8d2f4a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_satelite_auth_tokens_expires_at'), 'auth_tokens', ['expires_at'], unique=False, schema='satelite')
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_satelite_auth_tokens_expires_at'), table_name='auth_tokens', schema='satelite')
@@ -0,0 +1,82 @@
+"""Add satellite orbital element columns
+
+Revision ID: c7d41f0b9e23
+Revises: 9e4b7a13c6d2
+Create Date: 2025-07-21 10:14:48.602519
+
+"""
+from math import pi
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sgp4.api import Satrec
+from sgp4.conveniences import sat_epoch_datetime
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d41f0b9e23'
+down_revision: Union[str, None] = '9e4b7a13c6d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FLOAT_COLUMNS = (
+    'mean_motion_rev_day', 'period_min', 'semi_major_axis_km', 'apogee_km', 'perigee_km',
+    'inclination_deg', 'eccentricity', 'raan_deg',
+)
+INDEXED_COLUMNS = ('epoch', 'period_min', 'apogee_km', 'perigee_km', 'inclination_deg', 'eccentricity', 'raan_deg')
+BACKFILL_BATCH_SIZE = 2000
+
+
+def _elements(tle_line1, tle_line2):
+    # Копия TLE.tle_elements на момент миграции: миграция не должна зависеть от кода приложения
+    sat = Satrec.twoline2rv(tle_line1, tle_line2)
+    semi_major_axis = (398600.4418 / (sat.no_kozai / 60.0) ** 2) ** (1 / 3)
+    return {
+        'epoch': sat_epoch_datetime(sat).replace(tzinfo=None),
+        'mean_motion_rev_day': sat.no_kozai * 1440 / (2 * pi),
+        'period_min': 2 * pi / sat.no_kozai,
+        'semi_major_axis_km': semi_major_axis,
+        'apogee_km': semi_major_axis * (1 + sat.ecco) - 6378.137,
+        'perigee_km': semi_major_axis * (1 - sat.ecco) - 6378.137,
+        'inclination_deg': sat.inclo * 180 / pi,
+        'eccentricity': sat.ecco,
+        'raan_deg': sat.nodeo * 180 / pi,
+    }
+
+
+def upgrade() -> None:
+    op.add_column('satellites', sa.Column('epoch', sa.DateTime(), nullable=True), schema='satelite')
+    for column in FLOAT_COLUMNS:
+        op.add_column('satellites', sa.Column(column, sa.Float(), nullable=True), schema='satelite')
+
+    # Заполняем элементы уже загруженных спутников: их TLE не изменились, и upsert их не перезапишет
+    connection = op.get_bind()
+    satellites = sa.table(
+        'satellites', sa.column('norad_id'), sa.column('tle_line1'), sa.column('tle_line2'),
+        sa.column('epoch'), *(sa.column(column) for column in FLOAT_COLUMNS), schema='satelite'
+    )
+    update = satellites.update().where(satellites.c.norad_id == sa.bindparam('b_norad_id')).values(
+        **{column: sa.bindparam(column) for column in ('epoch', *FLOAT_COLUMNS)}
+    )
+    rows = connection.execute(sa.select(satellites.c.norad_id, satellites.c.tle_line1, satellites.c.tle_line2)).all()
+    for start in range(0, len(rows), BACKFILL_BATCH_SIZE):
+        values = []
+        for norad_id, tle_line1, tle_line2 in rows[start:start + BACKFILL_BATCH_SIZE]:
+            try:
+                values.append({'b_norad_id': norad_id, **_elements(tle_line1, tle_line2)})
+            except Exception:
+                continue
+        if values:
+            connection.execute(update, values)
+
+    for column in INDEXED_COLUMNS:
+        op.create_index(op.f(f'ix_satelite_satellites_{column}'), 'satellites', [column], unique=False, schema='satelite')
+
+
+def downgrade() -> None:
+    for column in INDEXED_COLUMNS:
+        op.drop_index(op.f(f'ix_satelite_satellites_{column}'), table_name='satellites', schema='satelite')
+    for column in reversed(FLOAT_COLUMNS):
+        op.drop_column('satellites', column, schema='satelite')
+    op.drop_column('satellites', 'epoch', schema='satelite')
@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Cookie
+from sqlalchemy import select, delete
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from passlib.context import CryptContext
 from pydantic import BaseModel
-from database import get_db
+from database import get_async_db, SessionLocal
 from models import User, AuthToken
+from metrics import timed, record_auth_lookup
+from loguru import logger
+from collections import OrderedDict
+import os
+import time
+import asyncio
 import secrets
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 auth_router = APIRouter()
@@ -14,6 +25,222 @@ pwd_context = CryptContext(
     bcrypt__rounds=12
 )
 
+# Сколько секунд токен живёт в кэше без проверки в БД; столько же после logout
+# токен может ещё работать в других процессах
+AUTH_TOKEN_CACHE_TTL_S = float(os.getenv("AUTH_TOKEN_CACHE_TTL_S", "60"))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+# Период и размер пачки удаления просроченных токенов
+AUTH_TOKEN_CLEANUP_INTERVAL_S = float(os.getenv("AUTH_TOKEN_CLEANUP_INTERVAL_S", "3600"))
+AUTH_TOKEN_CLEANUP_BATCH_SIZE = 1000
+
+# bcrypt отпускает GIL, поэтому пул потоков масштабируется по ядрам
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+# Сколько операций может ждать в очереди пула, дальше отвечаем 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(4 * PASSWORD_HASH_WORKERS)))
+
+
+class TokenCache:
+    """LRU cache of auth token -> (user_id, expires_at) with a TTL per entry."""
+
+    def __init__(self, ttl=AUTH_TOKEN_CACHE_TTL_S, max_size=AUTH_TOKEN_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        """Cached user_id for a live token, or None if the token has to be looked up."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                user_id, expires_at, cached_at = entry
+                if now - cached_at < self.ttl and expires_at > datetime.utcnow():
+                    self._entries.move_to_end(token)
+                    self.hits += 1
+                    return user_id
+                del self._entries[token]
+            self.misses += 1
+            return None
+
+    def put(self, token, user_id, expires_at):
+        with self._lock:
+            self._entries[token] = (user_id, expires_at, time.monotonic())
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+
+token_cache = TokenCache()
+
+
+async def resolve_token(db: AsyncSession, auth_token: str):
+    """User id of a live auth token, from the cache or a single-table lookup."""
+    user_id = token_cache.get(auth_token)
+    if user_id is not None:
+        record_auth_lookup("cache")
+        return user_id
+
+    with timed("auth_db_lookup"):
+        result = await db.execute(
+            select(AuthToken.user_id, AuthToken.expires_at).where(
+                AuthToken.token == auth_token,
+                AuthToken.expires_at > datetime.utcnow()
+            ).limit(1)
+        )
+        record = result.first()
+    if not record:
+        record_auth_lookup("invalid")
+        return None
+
+    record_auth_lookup("database")
+    token_cache.put(auth_token, record.user_id, record.expires_at)
+    return record.user_id
+
+
+async def get_current_user_id(
+        auth_token: str = Cookie(None, alias="auth_token"),
+        db: AsyncSession = Depends(get_async_db)
+) -> int:
+    """Shared dependency: id of the authenticated user or 401."""
+    if not auth_token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+
+    user_id = await resolve_token(db, auth_token)
+    if user_id is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    return user_id
+
+
+def delete_expired_tokens(db: Session, batch_size=AUTH_TOKEN_CLEANUP_BATCH_SIZE):
+    """Delete expired auth tokens in short batches; returns the number deleted."""
+    deleted = 0
+    while True:
+        expired = select(AuthToken.id).where(AuthToken.expires_at < datetime.utcnow()).limit(batch_size)
+        count = db.query(AuthToken).filter(AuthToken.id.in_(expired)).delete(synchronize_session=False)
+        db.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+async def run_token_cleanup(interval=AUTH_TOKEN_CLEANUP_INTERVAL_S):
+    """Background loop removing expired auth tokens every ``interval`` seconds."""
+    while True:
+        db = SessionLocal()
+        try:
+            deleted = await asyncio.to_thread(delete_expired_tokens, db)
+            if deleted:
+                logger.info(f"Deleted {deleted} expired auth tokens")
+        except Exception as e:
+            logger.error(f"Auth token cleanup failed: {e}")
+        finally:
+            db.close()
+        await asyncio.sleep(interval)
+
+class PasswordHasher:
+    """Runs bcrypt hashing and verification in a bounded thread pool off the event loop.
+
+    At most ``max_pending`` operations may be queued or running; beyond that
+    requests are rejected with 503 instead of piling up behind each other.
+    """
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING,
+                 latency_window=1000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.completed = 0
+        self.rejected = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        # Последние задержки (ожидание в очереди, сам bcrypt) в секундах
+        self._latencies = deque(maxlen=latency_window)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(pwd_context.verify, plain_password, hashed_password)
+
+    async def _submit(self, function, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication is busy, retry later",
+                    headers={"Retry-After": "1"}
+                )
+            self._pending += 1
+
+        submitted = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._latencies.append((started - submitted, finished - started))
+
+        def release(future):
+            with self._lock:
+                self._pending -= 1
+                if not future.cancelled():
+                    self.completed += 1
+
+        # Место в очереди освобождается, когда bcrypt действительно закончил: если клиент ушёл,
+        # ожидание отменяется, а уже запущенный расчёт продолжает занимать поток
+        future = self._executor.submit(run)
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            result = {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+        for i, name in enumerate(("queue_wait", "hash")):
+            values = sorted(latency[i] for latency in latencies)
+            result[f"{name}_ms"] = {
+                "p50": 1000 * values[len(values) // 2] if values else None,
+                "p95": 1000 * values[int(len(values) * 0.95)] if values else None,
+                "max": 1000 * values[-1] if values else None,
+            }
+        return result
+
+
+password_hasher = PasswordHasher()
+
+
 def create_user(db: Session, username: str, password: str):
     hashed_password = pwd_context.hash(password)
     user = User(
@@ -50,18 +277,18 @@ def generate_token(user_id: int) -> str:
 @auth_router.post("/register")
 async def register(
         data: RegisterRequest,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     # Проверка существующего пользователя
-    existing_user = db.query(User).filter(User.username == data.username).first()
+    existing_user = await db.scalar(select(User.id).where(User.username == data.username).limit(1))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
 
-    # Хеширование пароля
-    hashed_password = pwd_context.hash(data.password)
+    # Хеширование пароля в отдельном пуле, чтобы не блокировать event loop
+    hashed_password = await password_hasher.hash(data.password)
 
     # Создание пользователя
     new_user = User(
@@ -70,19 +297,22 @@ async def register(
     )
 
     db.add(new_user)
-    db.commit()
+    await db.commit()
 
     return {"message": "User registered successfully"}
 @auth_router.post("/login")
-def login(response: Response, data: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == data.username).first()
-    if not user or not verify_password(data.password, user.password_hash):
+async def login(response: Response, data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(
+        select(User.id, User.password_hash).where(User.username == data.username).limit(1)
+    )
+    user = result.first()
+    if not user or not await password_hasher.verify(data.password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
     token, expires_at = generate_token(user.id)
     db_token = AuthToken(user_id=user.id, token=token, expires_at=expires_at)
     db.add(db_token)
-    db.commit()
+    await db.commit()
 
     response.set_cookie(
         key="auth_token",
@@ -96,23 +326,29 @@ def login(response: Response, data: LoginRequest, db: Session = Depends(get_db))
 
 
 @auth_router.post("/logout")
-def logout(response: Response, db: Session = Depends(get_db)):
-    auth_token = response.cookies.get("auth_token")
+async def logout(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    # Токен приходит в куке запроса, а не ответа
+    auth_token = request.cookies.get("auth_token")
     if auth_token:
-        db.query(AuthToken).filter(AuthToken.token == auth_token).delete()
-        db.commit()
+        await db.execute(delete(AuthToken).where(AuthToken.token == auth_token))
+        await db.commit()
+        token_cache.invalidate(auth_token)
     response.delete_cookie("auth_token")
     return {"message": "Logged out"}
 
 
 @auth_router.get("/protected")
-def protected_route(auth_token: str = Depends(lambda request: request.cookies.get("auth_token")),
-                    db: Session = Depends(get_db)):
-    if not auth_token:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+async def protected_route(user_id: int = Depends(get_current_user_id)):
+    return {"message": "You have access"}
 
-    token_record = db.query(AuthToken).filter(AuthToken.token == auth_token).first()
-    if not token_record or token_record.expires_at < datetime.utcnow():
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session expired")
 
-    return {"message": "You have access"}
+@auth_router.get("/password_pool/stats")
+def password_pool_stats():
+    """Queue depth, rejections and latency of the bcrypt pool"""
+    return password_hasher.stats()
+
+
+@auth_router.get("/token_cache/stats")
+def token_cache_stats():
+    """Hit/miss counters of the auth token cache"""
+    return token_cache.stats()
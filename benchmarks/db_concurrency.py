@@ -0,0 +1,150 @@
+"""Concurrency of /my_satellites on the async session vs. a blocking session in the handler.
+
+PostgreSQL is replaced by a local SQLite stand-in with an artificial
+per-statement latency injected inside the driver thread, so waiting on the
+database costs wall time the way a network round trip does. The blocking
+variant reproduces the old handler: a sync Session queried directly inside
+``async def``.
+
+    python benchmarks/db_concurrency.py --requests 400 --concurrency 50 --latency-ms 10
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import Depends
+from sqlalchemy import create_engine, event, select, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+import main
+import models
+from ayth import get_current_user_id
+from database import get_async_db
+
+
+def build_stand_in(latency_s, pool_size, catalog=None, tracked=20):
+    """SQLite stand-in with a bench user tracking the first ``tracked`` satellites.
+
+    ``catalog`` is a list of (norad_id, tle_line1, tle_line2); by default 20
+    satellites without TLEs are created.
+    """
+    directory = tempfile.mkdtemp()
+    main_db, schema_db = os.path.join(directory, "main.db"), os.path.join(directory, "satelite.db")
+
+    def on_connect(connection):
+        cursor = connection.cursor()
+        cursor.execute(f"ATTACH DATABASE '{schema_db}' AS satelite")
+        cursor.close()
+        # Колбэк выполняется в потоке драйвера: задержка не трогает event loop сама по себе
+        connection.set_trace_callback(lambda statement: time.sleep(latency_s))
+
+    engine = create_engine(f"sqlite:///{main_db}", connect_args={"check_same_thread": False},
+                           pool_size=pool_size)
+    event.listen(engine, "connect", lambda dbapi_connection, record: on_connect(dbapi_connection))
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{main_db}", pool_size=pool_size)
+    event.listen(async_engine.sync_engine, "connect",
+                 lambda dbapi_connection, record: on_connect(dbapi_connection.driver_connection._conn))
+
+    models.Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    catalog = catalog or [(str(10000 + i), "", "") for i in range(20)]
+    with session_factory() as db:
+        user = models.User(username="bench", password_hash="-")
+        db.add(user)
+        db.flush()
+        db.execute(insert(models.Satellite), [
+            {"norad_id": norad_id, "name": f"SAT {norad_id}", "tle_line1": line1, "tle_line2": line2,
+             "change_seq": i + 1}
+            for i, (norad_id, line1, line2) in enumerate(catalog)
+        ])
+        db.execute(insert(models.UserSatellite), [
+            {"user_id": user.id, "norad_id": norad_id} for norad_id, _, _ in catalog[:tracked]
+        ])
+        db.commit()
+        user_id = user.id
+    return session_factory, async_engine, user_id
+
+
+async def run_load(path, requests, concurrency):
+    transport = httpx.ASGITransport(app=main.app)
+    latencies = []
+    # Кука нужна эндпоинтам, которые проверяют только её наличие
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 cookies={"auth_token": "bench"}) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(requests / elapsed, 1),
+        "p50_ms": round(1000 * latencies[len(latencies) // 2], 1),
+        "p95_ms": round(1000 * latencies[int(len(latencies) * 0.95)], 1),
+        "p99_ms": round(1000 * latencies[int(len(latencies) * 0.99)], 1),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=10.0)
+    parser.add_argument("--pool-size", type=int, default=10)
+    args = parser.parse_args()
+
+    session_factory, async_engine, user_id = build_stand_in(args.latency_ms / 1000, args.pool_size)
+    async_session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def stand_in_db():
+        async with async_session_factory() as db:
+            yield db
+
+    main.app.dependency_overrides[get_async_db] = stand_in_db
+    main.app.dependency_overrides[get_current_user_id] = lambda: user_id
+
+    # Прежний вариант обработчика: синхронная сессия прямо в async def
+    @main.app.get("/bench/my_satellites_blocking")
+    async def my_satellites_blocking(current_user_id: int = Depends(get_current_user_id)):
+        with session_factory() as db:
+            rows = db.execute(
+                select(models.Satellite.norad_id, models.Satellite.name)
+                .join(models.UserSatellite, models.UserSatellite.norad_id == models.Satellite.norad_id)
+                .where(models.UserSatellite.user_id == current_user_id)
+            ).all()
+        return {"tracked_satellites": [{"norad_id": r.norad_id, "name": r.name} for r in rows]}
+
+    async def run_all():
+        try:
+            return {
+                "parameters": vars(args),
+                "blocking_session": await run_load("/bench/my_satellites_blocking", args.requests, args.concurrency),
+                "async_session": await run_load("/my_satellites", args.requests, args.concurrency),
+            }
+        finally:
+            # Соединения aiosqlite держат свои потоки, закрываем их в том же event loop
+            await async_engine.dispose()
+
+    print(json.dumps(asyncio.run(run_all()), indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
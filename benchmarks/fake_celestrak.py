@@ -0,0 +1,99 @@
+"""Local stand-in for the CelesTrak GP endpoint serving a synthetic TLE catalog.
+
+Answers any GET with the catalog as three-line text and honours
+If-None-Match / If-Modified-Since like the real server, so the conditional
+fetch of CatalogRefresher can be exercised offline.
+
+    python benchmarks/fake_celestrak.py --objects 10000 --port 8001
+    TLE_SOURCE=http://127.0.0.1:8001/NORAD/elements/gp.php?GROUP=active&FORMAT=tle
+"""
+import os
+import sys
+import hashlib
+import argparse
+import threading
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import synthetic_catalog, catalog_text
+
+GP_PATH = "/NORAD/elements/gp.php?GROUP=active&FORMAT=tle"
+
+
+class FakeCelesTrak:
+    """Serves ``catalog`` over HTTP on 127.0.0.1 from a daemon thread."""
+
+    def __init__(self, catalog, port=0):
+        self.requests = 0
+        self.not_modified = 0
+        self.set_catalog(catalog)
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                service.requests += 1
+                body, etag, last_modified = service._body, service._etag, service._last_modified
+                if self.headers.get("If-None-Match") == etag or self.headers.get("If-Modified-Since") == last_modified:
+                    service.not_modified += 1
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}{GP_PATH}"
+
+    def set_catalog(self, catalog):
+        """Replace the served catalog; the next conditional request gets a 200 again."""
+        self._body = catalog_text(catalog).encode()
+        self._etag = '"' + hashlib.md5(self._body).hexdigest() + '"'
+        self._last_modified = formatdate(usegmt=True)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    server = FakeCelesTrak(synthetic_catalog(args.objects, seed=args.seed), port=args.port)
+    print(f"Serving {args.objects} objects at {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Latency of one /my_satellites/positions call vs. the per-satellite fan-out of the page.
+
+The fan-out is what html/index.html used to do to draw a user's view:
+/my_satellites, then /satellite/{id} for every tracked satellite, all at
+once. Both variants propagate now (exact=true), so the catalog snapshot
+does not hide the database and SGP4 work. The database is the SQLite
+stand-in of db_concurrency.py with an injected per-statement latency.
+
+    python benchmarks/my_satellites_positions.py --tracked 5,20,100 --latency-ms 1
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from synthetic import synthetic_catalog
+from db_concurrency import build_stand_in
+
+import main
+from ayth import get_current_user_id
+from database import get_async_db
+
+
+async def fan_out(client):
+    response = await client.get("/my_satellites")
+    response.raise_for_status()
+    ids = [sat["norad_id"] for sat in response.json()["tracked_satellites"]]
+    responses = await asyncio.gather(*(client.get(f"/satellite/{norad_id}?exact=true") for norad_id in ids))
+    for response in responses:
+        response.raise_for_status()
+    return 1 + len(ids)
+
+
+async def single(client):
+    response = await client.get("/my_satellites/positions?exact=true")
+    response.raise_for_status()
+    return 1
+
+
+async def measure(view, views, concurrency):
+    """Per-view latency percentiles with ``concurrency`` users refreshing at once."""
+    transport = httpx.ASGITransport(app=main.app)
+    latencies, requests = [], 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 cookies={"auth_token": "bench"}) as client:
+        # Прогрев: разбор TLE в кэш и соединения пула
+        await view(client)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            nonlocal requests
+            async with semaphore:
+                started = time.perf_counter()
+                count = await view(client)
+                requests += count
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(views)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "http_requests_per_view": requests // views,
+        "views_per_s": round(views / elapsed, 1),
+        "p50_ms": round(1000 * latencies[len(latencies) // 2], 1),
+        "p95_ms": round(1000 * latencies[int(len(latencies) * 0.95)], 1),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracked", default="5,20,100", help="satellites tracked by the user")
+    parser.add_argument("--views", type=int, default=100, help="page refreshes per variant")
+    parser.add_argument("--concurrency", type=int, default=10, help="users refreshing at the same time")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="injected latency per SQL statement")
+    parser.add_argument("--pool-size", type=int, default=10)
+    args = parser.parse_args()
+
+    results = {"parameters": vars(args), "tracked": {}}
+    for tracked in (int(t) for t in args.tracked.split(",")):
+        catalog = synthetic_catalog(max(tracked, 100), seed=3)
+        _, async_engine, user_id = build_stand_in(args.latency_ms / 1000, args.pool_size, catalog, tracked)
+        async_session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+        async def stand_in_db():
+            async with async_session_factory() as db:
+                yield db
+
+        main.app.dependency_overrides[get_async_db] = stand_in_db
+        main.app.dependency_overrides[get_current_user_id] = lambda: user_id
+
+        async def run_all():
+            try:
+                return {
+                    "fan_out": await measure(fan_out, args.views, args.concurrency),
+                    "single_query": await measure(single, args.views, args.concurrency),
+                }
+            finally:
+                await async_engine.dispose()
+
+        run = asyncio.run(run_all())
+        run["speedup_p50"] = round(run["fan_out"]["p50_ms"] / run["single_query"]["p50_ms"], 1)
+        results["tracked"][tracked] = run
+        main.app.dependency_overrides.clear()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
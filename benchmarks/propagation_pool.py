@@ -0,0 +1,70 @@
+"""Speedup of the multi-process propagation pool over in-process SGP4 on a synthetic catalog.
+
+    python benchmarks/propagation_pool.py --objects 50000 --steps 60 --workers 1,2,4,8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import synthetic_catalog
+from TLE import julian_date_range, propagate_batch
+from propagation import PropagationPool
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=50000)
+    parser.add_argument("--steps", type=int, default=60, help="time steps, one minute apart")
+    parser.add_argument("--workers", default=",".join(str(w) for w in (1, 2, 4, 8, 16) if w <= cpus))
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--start-method", default="spawn")
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(args.objects, seed=1)
+    tle_pairs = [(line1, line2) for _, line1, line2 in catalog]
+    start = datetime(2025, 7, 10)
+    jd, fr = julian_date_range(start, start + timedelta(minutes=args.steps - 1), 60)
+
+    # Однопроцессный эталон: разбор TLE вынесен из замера, как и у пула
+    propagate_batch(tle_pairs, jd=jd[:1], fr=fr[:1])
+    baseline = best_of(args.repeat, lambda: propagate_batch(tle_pairs, jd=jd, fr=fr))
+
+    results = {"parameters": {**vars(args), "cpu_count": cpus}, "in_process_s": round(baseline, 3), "pool": []}
+    for workers in (int(w) for w in args.workers.split(",")):
+        pool = PropagationPool(workers=workers, chunk_size=args.chunk_size, start_method=args.start_method)
+        try:
+            started = time.perf_counter()
+            pool.start()
+            pool.load(tle_pairs)
+            load_s = time.perf_counter() - started
+            elapsed = best_of(args.repeat, lambda: pool.propagate(jd, fr))
+        finally:
+            pool.shutdown()
+        results["pool"].append({
+            "workers": workers,
+            "start_and_load_s": round(load_s, 3),
+            "propagate_s": round(elapsed, 3),
+            "speedup": round(baseline / elapsed, 2),
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Offline benchmark suite: TLE.py kernels, catalog ingest and API endpoint latency.
+
+Every size runs on a synthetic catalog. The catalog is downloaded from a
+local fake CelesTrak server, and the endpoints are loaded through the ASGI
+app on a SQLite stand-in of the database. Results are written as flat JSON
+metrics. With --baseline each metric is compared against a stored run, and
+the exit code is 1 if any metric got worse by more than --tolerance.
+
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --baseline baseline.json --tolerance 0.2
+
+The upsert step of the ingest needs PostgreSQL (ON CONFLICT, sequences):
+it is measured only when --database-url is given.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from astropy.utils import iers
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from synthetic import synthetic_catalog
+from fake_celestrak import FakeCelesTrak
+from db_concurrency import build_stand_in, run_load
+
+import main
+import catalog
+from TLE import (
+    satellite_cache, get_orbit_and_position, julian_date_range, propagate_batch, teme_to_itrs
+)
+from ayth import get_current_user_id
+from database import get_async_db
+
+# Сюита работает без сети: astropy берёт таблицу IERS из astropy-iers-data и не пытается её скачать
+iers.conf.auto_download = False
+iers.conf.auto_max_age = None
+
+EPOCH = datetime(2025, 7, 10)
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def metric(value, unit, better="lower"):
+    return {"value": round(value, 6), "unit": unit, "better": better}
+
+
+def bench_kernels(size, tle_pairs, args):
+    """Propagation throughput, frame transform cost and the single-satellite path."""
+    results = {}
+    jd, fr = julian_date_range(EPOCH, EPOCH + timedelta(minutes=args.steps - 1), 60)
+    satellite_cache.clear()
+    parse_s = best_of(1, lambda: propagate_batch(tle_pairs, jd=jd[:1], fr=fr[:1]))
+    results["tle_parse_us_per_object"] = metric(1e6 * parse_s / size, "us")
+
+    batch = propagate_batch(tle_pairs, jd=jd, fr=fr)
+    elapsed = best_of(args.repeat, lambda: propagate_batch(tle_pairs, jd=jd, fr=fr))
+    results["propagate_points_per_s"] = metric(size * len(jd) / elapsed, "points/s", "higher")
+
+    position = batch["position"]
+    elapsed = best_of(args.repeat, lambda: teme_to_itrs(position, jd, fr, frames="fast"))
+    results["frames_fast_ns_per_point"] = metric(1e9 * elapsed / (size * len(jd)), "ns")
+
+    # astropy на порядки медленнее: меряем на подвыборке
+    sample = position[:min(size, 1000), :1]
+    elapsed = best_of(args.repeat, lambda: teme_to_itrs(sample, jd[:1], fr[:1], frames="astropy"))
+    results["frames_astropy_ns_per_point"] = metric(1e9 * elapsed / len(sample), "ns")
+
+    # Прежний путь эндпоинтов: один спутник за вызов, TLE уже в кэше
+    calls = tle_pairs[:200]
+    elapsed = best_of(args.repeat, lambda: [get_orbit_and_position(l1, l2, EPOCH) for l1, l2 in calls])
+    results["get_orbit_and_position_us"] = metric(1e6 * elapsed / len(calls), "us")
+    return results
+
+
+def bench_ingest(size, sat_catalog, args):
+    """Download from the fake CelesTrak, parse, and (with PostgreSQL) upsert."""
+    results = {}
+    with FakeCelesTrak(sat_catalog) as server:
+        refresher = catalog.CatalogRefresher(source=server.url, interval=0)
+
+        async def fetch():
+            started = time.perf_counter()
+            tle_data, _ = await refresher._fetch()
+            download = time.perf_counter() - started
+            started = time.perf_counter()
+            not_modified, _ = await refresher._fetch()
+            return tle_data, download, time.perf_counter() - started, not_modified
+
+        refresher._validators = {}
+        tle_data, download_s, _, _ = asyncio.run(fetch())
+        refresher._validators = {"etag": server._etag}
+        _, _, conditional_s, not_modified = asyncio.run(fetch())
+        assert not_modified is None, "fake CelesTrak ignored If-None-Match"
+
+    results["download_ms"] = metric(1000 * download_s, "ms")
+    results["conditional_fetch_ms"] = metric(1000 * conditional_s, "ms")
+    elapsed = best_of(args.repeat, lambda: catalog.parse_catalog(tle_data))
+    results["parse_ms"] = metric(1000 * elapsed, "ms")
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+        session_factory = sessionmaker(bind=engine)
+        rows = catalog.parse_catalog(tle_data)
+        with session_factory() as db:
+            started = time.perf_counter()
+            catalog.upsert_satellites(db, rows)
+            results["upsert_new_ms"] = metric(1000 * (time.perf_counter() - started), "ms")
+            started = time.perf_counter()
+            catalog.upsert_satellites(db, rows)
+            results["upsert_unchanged_ms"] = metric(1000 * (time.perf_counter() - started), "ms")
+        engine.dispose()
+    return results
+
+
+def bench_endpoints(size, sat_catalog, args):
+    """Latency percentiles of the main read endpoints under concurrent load."""
+    session_factory, async_engine, user_id = build_stand_in(args.latency_ms / 1000, args.pool_size, sat_catalog)
+    async_session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def stand_in_db():
+        async with async_session_factory() as db:
+            yield db
+
+    main.app.dependency_overrides[get_async_db] = stand_in_db
+    main.app.dependency_overrides[get_current_user_id] = lambda: user_id
+
+    ids = [norad_id for norad_id, _, _ in sat_catalog]
+    start = EPOCH.isoformat()
+    paths = {
+        "satellite": f"/satellite/{ids[len(ids) // 2]}",
+        "orbit_data_20": "/orbit_data?norad_ids=" + ",".join(ids[:20]),
+        "ephemeris_5_satellites": f"/ephemeris?norad_ids={','.join(ids[:5])}&start={start}&step=10&exact=true",
+        "catalog_page_1000": "/get_all_satellites?limit=1000",
+        "my_satellites": "/my_satellites",
+        "orbit_track_1024": f"/orbit_track/{ids[len(ids) // 3]}?points=1024",
+    }
+
+    async def run_all():
+        try:
+            return {name: await run_load(path, args.requests, args.concurrency) for name, path in paths.items()}
+        finally:
+            await async_engine.dispose()
+
+    satellite_cache.clear()
+    loads = asyncio.run(run_all())
+    main.app.dependency_overrides.clear()
+
+    results = {}
+    for name, load in loads.items():
+        results[f"{name}.requests_per_s"] = metric(load["requests_per_s"], "req/s", "higher")
+        for percentile in ("p50", "p95", "p99"):
+            results[f"{name}.{percentile}_ms"] = metric(load[f"{percentile}_ms"], "ms")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Relative change of every metric present in both runs; worse beyond tolerance is a regression."""
+    report, regressions = {}, []
+    for name, current in results["metrics"].items():
+        previous = baseline.get("metrics", {}).get(name)
+        if previous is None or not previous["value"]:
+            continue
+        change = current["value"] / previous["value"] - 1
+        worse = -change if current["better"] == "higher" else change
+        report[name] = {"baseline": previous["value"], "current": current["value"], "change": round(change, 3)}
+        if worse > tolerance:
+            regressions.append(name)
+    return report, regressions
+
+
+GROUPS = {"kernels": bench_kernels, "ingest": bench_ingest, "endpoints": bench_endpoints}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="catalog sizes")
+    parser.add_argument("--groups", default=",".join(GROUPS), help="kernels, ingest, endpoints")
+    parser.add_argument("--steps", type=int, default=10, help="propagation steps, one minute apart")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="injected latency per SQL statement")
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--database-url", help="PostgreSQL URL for the upsert part of the ingest benchmark")
+    parser.add_argument("--output", help="write results to this file instead of stdout")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    results = {
+        "parameters": {**vars(args)},
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpu_count": os.cpu_count()},
+        "created_at": datetime.utcnow().isoformat(),
+        "metrics": {},
+    }
+    groups = args.groups.split(",")
+    for size in (int(s) for s in args.sizes.split(",")):
+        sat_catalog = synthetic_catalog(size, seed=0)
+        tle_pairs = [(line1, line2) for _, line1, line2 in sat_catalog]
+        for group in groups:
+            started = time.perf_counter()
+            data = tle_pairs if group == "kernels" else sat_catalog
+            for name, value in GROUPS[group](size, data, args).items():
+                results["metrics"][f"{group}.{size}.{name}"] = value
+            print(f"{group} {size}: {time.perf_counter() - started:.1f} s", file=sys.stderr)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        results["comparison"], results["regressions"] = compare(results, baseline, args.tolerance)
+        exit_code = 1 if results["regressions"] else 0
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    for name in results.get("regressions", []):
+        print(f"REGRESSION {name}: {results['comparison'][name]}", file=sys.stderr)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main_cli()
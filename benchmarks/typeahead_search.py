@@ -0,0 +1,69 @@
+"""Latency of the typeahead index on a synthetic catalog, by kind of query.
+
+    python benchmarks/typeahead_search.py --objects 100000 --queries 2000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import synthetic_names
+from typeahead import TypeaheadIndex
+
+
+def query_sets(norad_ids, names, count, rng):
+    """Queries a user types: ID prefixes, name prefixes, inner words, substrings and typos."""
+    picks = rng.integers(0, len(names), size=count)
+    sets = {"id_prefix": [], "name_prefix": [], "word": [], "substring": [], "typo": []}
+    for i in picks.tolist():
+        name = names[i].lower()
+        sets["id_prefix"].append(norad_ids[i][:int(rng.integers(1, 6))])
+        sets["name_prefix"].append(name[:int(rng.integers(1, len(name) + 1))])
+        words = name.split()
+        sets["word"].append(words[-1] if len(words) > 1 else name[-3:])
+        start = int(rng.integers(0, max(len(name) - 3, 1)))
+        sets["substring"].append(name[start:start + 4])
+        # Пропущенная буква, как "starlnk"
+        drop = int(rng.integers(1, len(name)))
+        sets["typo"].append(name[:drop] + name[drop + 1:])
+    return sets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000, help="queries of every kind")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(2)
+    norad_ids = [str(10000 + i) for i in range(args.objects)]
+    names = synthetic_names(args.objects, seed=2)
+    index = TypeaheadIndex(check_s=0)
+    index.build(norad_ids, names)
+
+    results = {"parameters": vars(args), "index": index.stats(), "queries": {}}
+    for kind, queries in query_sets(norad_ids, names, args.queries, rng).items():
+        timings, empty = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            found = index.search(query, args.limit)
+            timings.append(time.perf_counter() - started)
+            empty += not found
+        timings = 1000 * np.array(timings)
+        results["queries"][kind] = {
+            "p50_ms": round(float(np.percentile(timings, 50)), 3),
+            "p99_ms": round(float(np.percentile(timings, 99)), 3),
+            "max_ms": round(float(timings.max()), 3),
+            "empty": empty,
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+import os
+import json
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+import httpx
+from sqlalchemy import or_, func, select, update, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from TLE import TLE_URL, process_tle_data, satellite_cache, tle_elements
+from database import SessionLocal
+from models import Satellite, satellite_change_seq
+from metrics import timed
+
+# Строк в одном INSERT: 14 параметров на строку, держимся ниже лимита в 65535
+UPSERT_BATCH_SIZE = 2000
+
+# URL CelesTrak, file:// URL, путь к файлу или к каталогу с зеркалом (*.tle, *.txt)
+TLE_SOURCE = os.getenv("TLE_SOURCE", TLE_URL)
+# Период фонового обновления в секундах, 0 отключает планировщик
+TLE_REFRESH_INTERVAL = int(os.getenv("TLE_REFRESH_INTERVAL", "3600"))
+TLE_FETCH_TIMEOUT = float(os.getenv("TLE_FETCH_TIMEOUT", "60"))
+
+# Элементы орбиты, которые загрузка извлекает из TLE в отдельные колонки
+ELEMENT_FIELDS = (
+    "epoch", "mean_motion_rev_day", "period_min", "semi_major_axis_km", "apogee_km", "perigee_km",
+    "inclination_deg", "eccentricity", "raan_deg",
+)
+
+# Типовые орбиты для /satellites/search: поле -> (минимум, максимум), None - без границы
+ORBIT_REGIMES = {
+    "leo": {"apogee_km": (None, 2000)},
+    "meo": {"perigee_km": (2000, None), "apogee_km": (None, 35586)},
+    # Пояс GEO: около одного оборота в сутки, почти круговая и почти экваториальная орбита
+    "geo": {"period_min": (1425.7, 1454.5), "eccentricity": (None, 0.01), "inclination_deg": (None, 15)},
+    "heo": {"eccentricity": (0.25, None)},
+    "sso": {"inclination_deg": (96, 104), "apogee_km": (None, 6000)},
+}
+
+# Поля спутника, доступные для проекции в /get_all_satellites
+CATALOG_FIELDS = ("norad_id", "name", "tle_line1", "tle_line2", "updated_at")
+# Строк, которые курсор на стороне сервера отдаёт за один раз при потоковой выдаче
+CATALOG_STREAM_BATCH_SIZE = 1000
+
+# Ключ pg_advisory_xact_lock, которым сериализуются записи каталога из всех воркеров и /fetch_tle
+CATALOG_WRITE_LOCK_KEY = 0x5A7E11
+# Колбэки вида listener(counts), вызываются после записи изменившегося каталога
+catalog_listeners = []
+
+
+def parse_catalog(tle_data):
+    """Turn raw three-line TLE text into satellite rows keyed by NORAD ID, with their orbital elements."""
+    rows = {}
+    for entry in process_tle_data(tle_data):
+        norad_id = entry["line2"].split()[1]
+        # ON CONFLICT не может изменить одну строку дважды: последняя запись побеждает
+        rows[norad_id] = {
+            "norad_id": norad_id,
+            "name": entry["satellite_name"],
+            "tle_line1": entry["line1"],
+            "tle_line2": entry["line2"],
+        }
+    for row in rows.values():
+        try:
+            row.update(tle_elements(row["tle_line1"], row["tle_line2"]))
+        except Exception as e:
+            logger.warning(f"Cannot extract elements of {row['norad_id']}: {e}")
+            row.update(dict.fromkeys(ELEMENT_FIELDS))
+    return list(rows.values())
+
+
+def upsert_satellites(db: Session, rows, prune=False):
+    """Apply catalog rows as one set-based upsert into satelite.satellites.
+
+    Rows whose TLE lines are unchanged are skipped by the ON CONFLICT WHERE
+    clause. With ``prune`` the rows are treated as the complete catalog and
+    satellites missing from them are marked removed. Every inserted, updated
+    or removed row takes the next change_seq. Everything runs in a single
+    transaction under CATALOG_WRITE_LOCK_KEY, so concurrent writers commit
+    in change_seq order. Returns the number of inserted, updated, unchanged
+    and removed rows.
+    """
+    table = Satellite.__table__
+    now = datetime.utcnow()
+    inserted, updated, removed = 0, 0, 0
+
+    try:
+        # Версия каталога - max(change_seq). Если бы транзакция с меньшими номерами фиксировалась
+        # после транзакции с большими, клиент /catalog/changes?since= её пропустил бы. Поэтому номера
+        # берутся только под блокировкой, которая отпускается при фиксации
+        db.execute(select(func.pg_advisory_xact_lock(CATALOG_WRITE_LOCK_KEY)))
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            chunk = rows[start:start + UPSERT_BATCH_SIZE]
+            stmt = insert(table).values([
+                {**row, "updated_at": now, "change_seq": satellite_change_seq.next_value()}
+                for row in chunk
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.norad_id],
+                set_={
+                    "name": stmt.excluded.name,
+                    "tle_line1": stmt.excluded.tle_line1,
+                    "tle_line2": stmt.excluded.tle_line2,
+                    "updated_at": stmt.excluded.updated_at,
+                    "change_seq": satellite_change_seq.next_value(),
+                    "removed_at": None,
+                    **{field: stmt.excluded[field] for field in ELEMENT_FIELDS},
+                },
+                where=or_(
+                    table.c.tle_line1.is_distinct_from(stmt.excluded.tle_line1),
+                    table.c.tle_line2.is_distinct_from(stmt.excluded.tle_line2),
+                    table.c.removed_at.isnot(None),
+                ),
+            ).returning(table.c.norad_id, literal_column("(xmax = 0)").label("inserted"))
+
+            for norad_id, was_inserted in db.execute(stmt):
+                if was_inserted:
+                    inserted += 1
+                else:
+                    updated += 1
+                    satellite_cache.invalidate(norad_id)
+
+        # Пустой или оборванный источник не должен пометить удалённым весь каталог
+        if prune and rows:
+            stmt = update(table).where(
+                table.c.removed_at.is_(None),
+                table.c.norad_id.not_in([row["norad_id"] for row in rows]),
+            ).values(removed_at=now, change_seq=satellite_change_seq.next_value())
+            removed = db.execute(stmt).rowcount
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": len(rows) - inserted - updated,
+        "removed": removed,
+    }
+
+
+def ingest_tle_data(db: Session, tle_data, prune=False):
+    """Parse a TLE catalog and bulk-upsert it; returns the row counts."""
+    with timed("catalog_parse"):
+        rows = parse_catalog(tle_data)
+    with timed("catalog_upsert", len(rows)):
+        result = upsert_satellites(db, rows, prune)
+    logger.info(
+        f"Catalog ingested: {result['inserted']} inserted, "
+        f"{result['updated']} updated, {result['unchanged']} unchanged, {result['removed']} removed"
+    )
+    if result["inserted"] or result["updated"] or result["removed"]:
+        notify_catalog_changed(result)
+    return result
+
+
+def notify_catalog_changed(counts):
+    """Tell in-memory consumers of the catalog that satelite.satellites changed."""
+    for listener in catalog_listeners:
+        try:
+            listener(counts)
+        except Exception as e:
+            logger.error(f"Catalog listener {listener} failed: {e}")
+
+
+def catalog_fields(fields=None):
+    """Validate a comma-separated projection; None means all CATALOG_FIELDS."""
+    if not fields:
+        return list(CATALOG_FIELDS)
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in CATALOG_FIELDS]
+    if unknown or not selected:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}; allowed: {', '.join(CATALOG_FIELDS)}")
+    # Без дубликатов, порядок как в запросе
+    return list(dict.fromkeys(selected))
+
+
+def catalog_version(db: Session):
+    """Catalog version: the latest change_seq, 0 for an empty catalog."""
+    return db.query(func.max(Satellite.change_seq)).scalar() or 0
+
+
+def catalog_changes(db: Session, since, limit):
+    """Satellites inserted, updated or removed after catalog version ``since``.
+
+    Returns (changes, version, has_more); the next call continues from
+    ``version``, the change_seq of the last returned row. Reads only the
+    change_seq index range, not the whole catalog.
+    """
+    rows = db.query(
+        Satellite.norad_id, Satellite.name, Satellite.tle_line1, Satellite.tle_line2,
+        Satellite.updated_at, Satellite.removed_at, Satellite.change_seq
+    ).filter(Satellite.change_seq > since).order_by(Satellite.change_seq).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changes = [
+        {
+            "norad_id": row.norad_id,
+            "change_seq": row.change_seq,
+            "removed": row.removed_at is not None,
+            **({} if row.removed_at is not None else {
+                "name": row.name,
+                "tle_line1": row.tle_line1,
+                "tle_line2": row.tle_line2,
+                "updated_at": row.updated_at.isoformat(),
+            }),
+        }
+        for row in rows
+    ]
+    version = rows[-1].change_seq if rows else since
+    return changes, version, has_more
+
+
+def catalog_query(db: Session, fields, after=None, limit=None):
+    """Column query over the active catalog ordered by NORAD ID, with keyset pagination."""
+    query = db.query(*(getattr(Satellite, field) for field in fields)) \
+        .filter(Satellite.removed_at.is_(None)).order_by(Satellite.norad_id)
+    if after is not None:
+        query = query.filter(Satellite.norad_id > after)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def catalog_rows_for(db: Session, fields, norad_ids):
+    """Projected active satellites with the given NORAD IDs, keyed by NORAD ID."""
+    query_fields = fields if "norad_id" in fields else fields + ["norad_id"]
+    rows = db.query(*(getattr(Satellite, field) for field in query_fields)) \
+        .filter(Satellite.norad_id.in_(norad_ids), Satellite.removed_at.is_(None))
+    return {row.norad_id: catalog_row(row, fields) for row in rows}
+
+
+def satellite_search(db: Session, ranges, after=None, limit=None):
+    """Active satellites whose element columns fall into ``ranges`` (field -> (min, max)).
+
+    Every bound is a condition on an indexed column, so the filter runs in
+    SQL. Rows are ordered by NORAD ID for keyset pagination like catalog_query.
+    """
+    query = db.query(Satellite.norad_id, Satellite.name, *(getattr(Satellite, field) for field in ELEMENT_FIELDS)) \
+        .filter(Satellite.removed_at.is_(None)).order_by(Satellite.norad_id)
+    for field, (low, high) in ranges.items():
+        column = getattr(Satellite, field)
+        if low is not None:
+            query = query.filter(column >= low)
+        if high is not None:
+            query = query.filter(column <= high)
+    if after is not None:
+        query = query.filter(Satellite.norad_id > after)
+    if limit is not None:
+        query = query.limit(limit)
+    return [
+        {**row._asdict(), "epoch": row.epoch.isoformat() if row.epoch is not None else None}
+        for row in query
+    ]
+
+
+def catalog_row(row, fields):
+    """Projected satellite row as the JSON dict /get_all_satellites returns."""
+    item = dict(zip(fields, row))
+    if item.get("updated_at") is not None:
+        item["updated_at"] = item["updated_at"].isoformat()
+    return item
+
+
+def stream_catalog_json(fields, after=None, limit=None):
+    """Yield the catalog as a JSON array while rows come from a server-side cursor.
+
+    Opens its own session: the request session is closed before a streaming
+    response is sent.
+    """
+    db = SessionLocal()
+    try:
+        query = catalog_query(db, fields, after, limit).execution_options(
+            stream_results=True, yield_per=CATALOG_STREAM_BATCH_SIZE
+        )
+        separator = "["
+        batch = []
+        for row in query:
+            batch.append(json.dumps(catalog_row(row, fields)))
+            if len(batch) == CATALOG_STREAM_BATCH_SIZE:
+                yield (separator + ",".join(batch)).encode()
+                separator, batch = ",", []
+        if batch or separator == "[":
+            yield (separator + ",".join(batch)).encode()
+        yield b"]"
+    finally:
+        db.close()
+
+
+class CatalogRefresher:
+    """Background catalog refresh with conditional fetch and request coalescing.
+
+    Concurrent callers of ``refresh`` share the refresh already in flight
+    instead of starting another one.
+    """
+
+    def __init__(self, source=TLE_SOURCE, interval=TLE_REFRESH_INTERVAL):
+        self.source = source
+        self.interval = interval
+        self.last_result = None
+        self.last_refresh = None
+        self._validators = {}
+        self._current = None
+        self._task = None
+
+    def refresh(self):
+        """Start a refresh or join the running one; returns the shared task."""
+        if self._current is None or self._current.done():
+            self._current = asyncio.create_task(self._refresh())
+        return self._current
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Catalog refresher started: every {self.interval} s from {self.source}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.shield(self.refresh())
+            except Exception as e:
+                logger.error(f"Scheduled TLE refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _refresh(self):
+        with timed("catalog_fetch"):
+            tle_data, validators = await self._fetch()
+        if tle_data is None:
+            result = {"status": "TLE data not modified"}
+        else:
+            counts = await asyncio.to_thread(self._ingest, tle_data)
+            # Валидаторы запоминаем только после успешной записи, иначе повторим загрузку
+            self._validators = validators
+            result = {"status": "TLE data updated successfully", **counts}
+
+        self.last_result = result
+        self.last_refresh = datetime.utcnow()
+        return result
+
+    async def _fetch(self):
+        """Return (tle lines, validators), or (None, ...) when the source is unchanged."""
+        parsed = urlparse(self.source)
+        if parsed.scheme in ("http", "https"):
+            return await self._fetch_http()
+        path = Path(unquote(parsed.path) if parsed.scheme == "file" else self.source)
+        return await asyncio.to_thread(self._read_local, path)
+
+    async def _fetch_http(self):
+        headers = {}
+        if "etag" in self._validators:
+            headers["If-None-Match"] = self._validators["etag"]
+        if "last_modified" in self._validators:
+            headers["If-Modified-Since"] = self._validators["last_modified"]
+
+        async with httpx.AsyncClient(timeout=TLE_FETCH_TIMEOUT, follow_redirects=True) as client:
+            response = await client.get(self.source, headers=headers)
+
+        if response.status_code == 304:
+            return None, self._validators
+        if response.status_code != 200:
+            raise Exception(f"Error loading TLE data: HTTP {response.status_code}")
+
+        validators = {}
+        if "etag" in response.headers:
+            validators["etag"] = response.headers["etag"]
+        if "last-modified" in response.headers:
+            validators["last_modified"] = response.headers["last-modified"]
+        return response.text.splitlines(), validators
+
+    def _read_local(self, path):
+        files = sorted(
+            p for p in path.iterdir() if p.suffix in (".tle", ".txt")
+        ) if path.is_dir() else [path]
+        signature = tuple((str(p), p.stat().st_mtime_ns, p.stat().st_size) for p in files)
+        if signature == self._validators.get("signature"):
+            return None, self._validators
+
+        tle_data = []
+        for p in files:
+            tle_data.extend(p.read_text(encoding="utf-8").splitlines())
+        return tle_data, {"signature": signature}
+
+    @staticmethod
+    def _ingest(tle_data):
+        db = SessionLocal()
+        try:
+            # Источник отдаёт каталог целиком: пропавшие из него спутники помечаем удалёнными
+            counts = ingest_tle_data(db, tle_data, prune=True)
+            return {**counts, "version": catalog_version(db)}
+        finally:
+            db.close()
+
+
+refresher = CatalogRefresher()
@@ -0,0 +1,264 @@
+import os
+import mmap
+import struct
+import numpy as np
+from datetime import datetime, timezone
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки flock нет, хранилище недоступно
+    fcntl = None
+
+# Каталог для файлов хранилища; в /dev/shm файлы живут в памяти. Пусто - хранилище выключено
+CATALOG_STORE_DIR = os.getenv("CATALOG_STORE_DIR", "")
+# Как часто читающие воркеры проверяют новое поколение и пробуют стать писателем
+CATALOG_STORE_POLL_S = float(os.getenv("CATALOG_STORE_POLL_S", "1"))
+
+STORE_MAGIC = b"SATC"
+STORE_FORMAT_VERSION = 1
+# magic, версия формата, поколение, число спутников, момент снимка (unix), время построения
+STORE_HEADER = struct.Struct("<4sH2xQQdd")
+STORE_HEADER_SIZE = 64
+# Указатель на текущее поколение: номер поколения и слот
+CURRENT_POINTER = struct.Struct("<QB")
+COLUMN_ALIGNMENT = 64
+
+ORBITAL_PARAMETERS = (
+    "semi_major_axis_km", "eccentricity", "inclination_deg",
+    "right_ascension_deg", "argument_perigee_deg", "mean_anomaly_deg",
+)
+
+# Колонки файла: имя, dtype, форма одной строки. Строки отсортированы по norad_id
+STORE_COLUMNS = (
+    ("norad_id", "S16", ()),
+    ("name", "S64", ()),
+    ("tle_line1", "S69", ()),
+    ("tle_line2", "S69", ()),
+    ("epoch_jd", "<f8", ()),
+    ("mean_motion_rev_day", "<f8", ()),
+    ("bstar", "<f8", ()),
+    *((name, "<f8", ()) for name in ORBITAL_PARAMETERS),
+    ("valid", "u1", ()),
+    ("xyz_km", "<f8", (3,)),
+    ("velocity_km_s", "<f8", (3,)),
+    ("latitude_deg", "<f8", ()),
+    ("longitude_deg", "<f8", ()),
+    ("altitude_km", "<f8", ()),
+)
+
+
+def store_layout(count):
+    """Byte offset of every column for ``count`` rows and the total file size."""
+    offsets, offset = {}, STORE_HEADER_SIZE
+    for name, dtype, shape in STORE_COLUMNS:
+        offsets[name] = offset
+        size = count * int(np.prod(shape, dtype=int)) * np.dtype(dtype).itemsize
+        offset += -(-size // COLUMN_ALIGNMENT) * COLUMN_ALIGNMENT
+    return offsets, offset
+
+
+def catalog_columns(norad_ids, names, tle_pairs, entries):
+    """Element columns of the catalog sorted by NORAD ID, and the sort order.
+
+    ``entries`` are the (satrec, orbital_parameters) pairs of satellite_cache.
+    The order is applied to every snapshot published for this catalog.
+    """
+    keys = np.array([norad_id.encode() for norad_id in norad_ids], dtype="S16")
+    order = np.argsort(keys, kind="stable")
+    satrecs = [sat for sat, _ in entries]
+    columns = {
+        "norad_id": keys,
+        "name": np.array([(name or "").encode()[:64] for name in names], dtype="S64"),
+        "tle_line1": np.array([line1.encode() for line1, _ in tle_pairs], dtype="S69"),
+        "tle_line2": np.array([line2.encode() for _, line2 in tle_pairs], dtype="S69"),
+        "epoch_jd": np.array([sat.jdsatepoch + sat.jdsatepochF for sat in satrecs], dtype=float),
+        "mean_motion_rev_day": np.array([sat.no_kozai * 1440 / (2 * np.pi) for sat in satrecs], dtype=float),
+        "bstar": np.array([sat.bstar for sat in satrecs], dtype=float),
+    }
+    for name in ORBITAL_PARAMETERS:
+        columns[name] = np.array([params[name] for _, params in entries], dtype=float)
+    return {name: values[order] for name, values in columns.items()}, order
+
+
+class SharedCatalogSnapshot:
+    """Read-only view of one store generation, mapped from the file without copying.
+
+    Has the interface of snapshot.CatalogSnapshot that the endpoints use.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.generation, count, timestamp, self.build_time_s = \
+            STORE_HEADER.unpack_from(self._mmap)
+        if magic != STORE_MAGIC or version != STORE_FORMAT_VERSION:
+            raise ValueError(f"{path} is not a catalog store file of format {STORE_FORMAT_VERSION}")
+
+        self.timestamp = datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+        offsets, _ = store_layout(count)
+        self.columns = {
+            name: np.frombuffer(self._mmap, dtype=dtype, count=count * int(np.prod(shape, dtype=int)),
+                                offset=offsets[name]).reshape((count, *shape))
+            for name, dtype, shape in STORE_COLUMNS
+        }
+        self.norad_ids = self.columns["norad_id"]
+
+    def _row(self, norad_id):
+        key = str(norad_id).encode()
+        i = int(np.searchsorted(self.norad_ids, key))
+        if i < len(self.norad_ids) and self.norad_ids[i] == key:
+            return i
+        return None
+
+    def get(self, norad_id):
+        """Satellite entry in the /orbit_data format, or None if it is not in the snapshot."""
+        i = self._row(norad_id)
+        columns = self.columns
+        if i is None or not columns["valid"][i]:
+            return None
+
+        x, y, z = columns["xyz_km"][i].tolist()
+        vx, vy, vz = columns["velocity_km_s"][i].tolist()
+        return {
+            "norad_id": str(norad_id),
+            "name": columns["name"][i].decode(errors="replace"),
+            "timestamp": self.timestamp.isoformat(),
+            "orbit_data": {
+                "position": {"x": x, "y": y, "z": z},
+                "velocity_teme_km_s": {"x": vx, "y": vy, "z": vz},
+                "orbital_parameters": {name: float(columns[name][i]) for name in ORBITAL_PARAMETERS},
+                "current_lat_lon_alt": {
+                    "latitude_deg": float(columns["latitude_deg"][i]),
+                    "longitude_deg": float(columns["longitude_deg"][i]),
+                    "altitude_km": float(columns["altitude_km"][i]),
+                }
+            }
+        }
+
+    @property
+    def nbytes(self):
+        """Size of the mapping; the pages are shared by all workers."""
+        return len(self._mmap)
+
+
+class CatalogStore:
+    """Columnar catalog and position snapshot in files shared by all uvicorn workers.
+
+    One worker, the holder of an exclusive flock, publishes; the others map the
+    latest generation read-only. Generations alternate between two slot files.
+    A new generation is written in full to a temporary file and renamed over
+    its slot, so a reader still mapping an older generation keeps its inode.
+    The ``current`` pointer file is replaced last.
+    """
+
+    def __init__(self, directory=CATALOG_STORE_DIR):
+        self.directory = directory
+        self.generation = 0
+        self.published = 0
+        self._lock_file = None
+        self._snapshot = None
+
+    @property
+    def enabled(self):
+        return bool(self.directory) and fcntl is not None
+
+    @property
+    def is_writer(self):
+        return self._lock_file is not None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def try_become_writer(self):
+        """Take the writer lock if nobody holds it; a crashed writer releases it with its process."""
+        if self._lock_file is not None:
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(self._path("writer.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self.generation = self._read_pointer()[0]
+        logger.info(f"Catalog store writer: pid {os.getpid()}, {self.directory}")
+        return True
+
+    def release(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def publish(self, columns, order, snapshot):
+        """Write the next generation: element ``columns`` and ``order`` from catalog_columns,
+        and the position arrays of a CatalogSnapshot of the same catalog."""
+        generation = self.generation + 1
+        slot = generation % 2
+        count = len(columns["norad_id"])
+        offsets, size = store_layout(count)
+        positions = {
+            "valid": snapshot.valid.astype(np.uint8),
+            "xyz_km": snapshot.xyz_km,
+            "velocity_km_s": snapshot.velocity_km_s,
+            "latitude_deg": snapshot.latitude_deg,
+            "longitude_deg": snapshot.longitude_deg,
+            "altitude_km": snapshot.altitude_km,
+        }
+
+        path = self._path(f"catalog.{slot}")
+        with open(path + ".tmp", "w+b") as f:
+            f.truncate(size)
+            with mmap.mmap(f.fileno(), size) as buffer:
+                STORE_HEADER.pack_into(
+                    buffer, 0, STORE_MAGIC, STORE_FORMAT_VERSION, generation, count,
+                    snapshot.timestamp.replace(tzinfo=timezone.utc).timestamp(), snapshot.build_time_s
+                )
+                for name, dtype, shape in STORE_COLUMNS:
+                    values = columns[name] if name in columns else positions[name][order]
+                    target = np.frombuffer(buffer, dtype=dtype, count=values.size, offset=offsets[name])
+                    target[:] = values.reshape(-1)
+                    # Представление держит буфер mmap, его нужно отпустить до закрытия
+                    del target
+        os.replace(path + ".tmp", path)
+
+        pointer = self._path("current")
+        with open(pointer + ".tmp", "wb") as f:
+            f.write(CURRENT_POINTER.pack(generation, slot))
+        os.replace(pointer + ".tmp", pointer)
+        self.generation = generation
+        self.published += 1
+
+    def _read_pointer(self):
+        try:
+            with open(self._path("current"), "rb") as f:
+                return CURRENT_POINTER.unpack(f.read(CURRENT_POINTER.size))
+        except (FileNotFoundError, struct.error):
+            return 0, 0
+
+    def read(self):
+        """Latest published generation, mapped once per generation; None before the first one."""
+        generation, slot = self._read_pointer()
+        if generation == 0:
+            return None
+        if self._snapshot is None or self._snapshot.generation < generation:
+            snapshot = SharedCatalogSnapshot(self._path(f"catalog.{slot}"))
+            # Слот мог быть уже перезаписан ещё более новым поколением - оно тоже годится
+            if snapshot.generation >= generation:
+                self._snapshot = snapshot
+                self.generation = snapshot.generation
+        return self._snapshot
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "role": "writer" if self.is_writer else "reader",
+            "generation": self.generation,
+            "published": self.published,
+            "mapped_bytes": self._snapshot.nbytes if self._snapshot is not None else None,
+        }
+
+
+catalog_store = CatalogStore()
@@ -0,0 +1,313 @@
+import os
+import time
+import asyncio
+import numpy as np
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from loguru import logger
+
+from TLE import julian_dates, propagate_batch, teme_to_itrs, itrs_to_geodetic, get_ephemeris, sample_count
+from catalog import catalog_listeners
+from database import SessionLocal
+from models import Satellite
+
+# Длина скользящего окна в часах, 0 отключает кэш
+EPHEMERIS_CACHE_WINDOW_HOURS = float(os.getenv("EPHEMERIS_CACHE_WINDOW_HOURS", "2"))
+EPHEMERIS_CACHE_SEGMENT_MIN = float(os.getenv("EPHEMERIS_CACHE_SEGMENT_MIN", "30"))
+EPHEMERIS_CACHE_DEGREE = int(os.getenv("EPHEMERIS_CACHE_DEGREE", "11"))
+# Спутники с большей ошибкой интерполяции не обслуживаются из кэша
+EPHEMERIS_CACHE_MAX_ERROR_KM = float(os.getenv("EPHEMERIS_CACHE_MAX_ERROR_KM", "0.001"))
+# Как часто фоновая задача проверяет, не пора ли сдвинуть окно или учесть новые TLE
+EPHEMERIS_CACHE_CHECK_S = 60
+# Спутников в одном вызове SGP4 при построении
+FIT_CHUNK_SIZE = 2000
+# Доли сегмента, в которых ошибка аппроксимации сверяется с SGP4
+_CHECK_FRACTIONS = np.array([0.07, 0.31, 0.5, 0.69, 0.93])
+
+
+def chebyshev_nodes(degree):
+    """Chebyshev points of the first kind on [-1, 1], in decreasing order."""
+    n = degree + 1
+    return np.cos(np.pi * (np.arange(n) + 0.5) / n)
+
+
+def chebyshev_fit_matrix(degree):
+    """Matrix turning values at chebyshev_nodes into series coefficients."""
+    n = degree + 1
+    j, k = np.meshgrid(np.arange(n), np.arange(n), indexing="ij")
+    matrix = 2.0 / n * np.cos(np.pi * j * (k + 0.5) / n)
+    matrix[0] /= 2
+    return matrix
+
+
+def chebyshev_basis(x, degree):
+    """T_0..T_degree at points x: array (..., degree + 1)."""
+    basis = np.empty(x.shape + (degree + 1,))
+    basis[..., 0] = 1.0
+    if degree:
+        basis[..., 1] = x
+    for j in range(2, degree + 1):
+        basis[..., j] = 2 * x * basis[..., j - 1] - basis[..., j - 2]
+    return basis
+
+
+@dataclass(frozen=True)
+class EphemerisFit:
+    """One built window of the cache: what evaluate reads, published as a whole.
+
+    ``window_start`` is None until the first fit. ``index`` maps a NORAD ID
+    to its row in ``tle``, ``coefficients`` (satellites, segments, 3,
+    degree + 1) and ``max_error``.
+    """
+
+    window_start: datetime
+    index: dict
+    tle: list
+    coefficients: np.ndarray
+    max_error: np.ndarray
+    refitted: int = 0
+    build_time_s: float = None
+
+
+class ChebyshevEphemeris:
+    """Piecewise Chebyshev fits of ITRS positions of the catalog over a rolling window.
+
+    The window is cut into equal segments; each satellite has ``degree + 1``
+    coefficients per segment and axis, fitted to SGP4 + frame transform at
+    Chebyshev nodes. Every fit is checked against direct SGP4 between the
+    nodes; satellites above ``max_error_km`` are not served.
+    """
+
+    def __init__(self, window_hours=EPHEMERIS_CACHE_WINDOW_HOURS, segment_min=EPHEMERIS_CACHE_SEGMENT_MIN,
+                 degree=EPHEMERIS_CACHE_DEGREE, max_error_km=EPHEMERIS_CACHE_MAX_ERROR_KM):
+        self.segment_s = segment_min * 60
+        self.segments = max(int(np.ceil(window_hours * 3600 / self.segment_s)), 1)
+        self.window_hours = window_hours
+        self.degree = degree
+        self.max_error_km = max_error_km
+        # Текущее окно; заменяется только целиком, поля не меняются
+        self.state = EphemerisFit(None, {}, [], np.empty((0, self.segments, 3, degree + 1)), np.empty(0))
+        self._fit_matrix = chebyshev_fit_matrix(degree)
+        self._catalog_dirty = True
+        self._task = None
+        catalog_listeners.append(self.mark_catalog_changed)
+
+    def mark_catalog_changed(self, counts=None):
+        self._catalog_dirty = True
+
+    @property
+    def window_start(self):
+        return self.state.window_start
+
+    @property
+    def window_stop(self):
+        window_start = self.window_start
+        if window_start is None:
+            return None
+        return window_start + timedelta(seconds=self.segments * self.segment_s)
+
+    def start(self):
+        if self.window_hours > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if self._needs_rebuild():
+                    await asyncio.to_thread(self.rebuild)
+            except Exception as e:
+                logger.error(f"Ephemeris cache rebuild failed: {e}")
+            await asyncio.sleep(EPHEMERIS_CACHE_CHECK_S)
+
+    def _needs_rebuild(self, now=None):
+        now = now or datetime.utcnow()
+        window_start = self.window_start
+        # Окно сдвигаем, когда до его конца остаётся меньше половины
+        return (
+            self._catalog_dirty or window_start is None
+            or now > window_start + timedelta(seconds=self.segments * self.segment_s / 2)
+        )
+
+    def rebuild(self, now=None):
+        """Refit the catalog over a window starting one segment before ``now``.
+
+        Fits of satellites whose TLE did not change are reused when the window
+        did not move.
+        """
+        self._catalog_dirty = False
+        db = SessionLocal()
+        try:
+            rows = db.query(Satellite.norad_id, Satellite.tle_line1, Satellite.tle_line2) \
+                .filter(Satellite.removed_at.is_(None)).all()
+        finally:
+            db.close()
+        self.fit([row.norad_id for row in rows], [(row.tle_line1, row.tle_line2) for row in rows], now)
+
+    def fit(self, norad_ids, tle_pairs, now=None):
+        started = time.perf_counter()
+        now = now or datetime.utcnow()
+        # Начало окна выравниваем по сегменту, чтобы сдвиг окна не зависел от момента вызова
+        epoch = datetime(now.year, now.month, now.day)
+        aligned = int((now - epoch).total_seconds() // self.segment_s - 1) * self.segment_s
+        window_start = epoch + timedelta(seconds=aligned)
+
+        coefficients = np.full((len(tle_pairs), self.segments, 3, self.degree + 1), np.nan)
+        max_error = np.full(len(tle_pairs), np.inf)
+        refit = []
+        previous = self.state
+        for i, (norad_id, pair) in enumerate(zip(norad_ids, tle_pairs)):
+            old = previous.index.get(norad_id) if previous.window_start == window_start else None
+            if old is not None and previous.tle[old] == pair:
+                coefficients[i] = previous.coefficients[old]
+                max_error[i] = previous.max_error[old]
+            else:
+                refit.append(i)
+
+        for chunk_start in range(0, len(refit), FIT_CHUNK_SIZE):
+            chunk = refit[chunk_start:chunk_start + FIT_CHUNK_SIZE]
+            coefficients[chunk], max_error[chunk] = self._fit_chunk(
+                [tle_pairs[i] for i in chunk], window_start
+            )
+
+        build_time_s = time.perf_counter() - started
+        # Окно публикуется одним присваиванием: evaluate в другом потоке берёт
+        # либо старое состояние целиком, либо новое, но не их смесь
+        self.state = EphemerisFit(
+            window_start=window_start,
+            index={norad_id: i for i, norad_id in enumerate(norad_ids)},
+            tle=list(tle_pairs),
+            coefficients=coefficients,
+            max_error=max_error,
+            refitted=len(refit),
+            build_time_s=build_time_s,
+        )
+        logger.info(
+            f"Ephemeris cache: {len(refit)} of {len(tle_pairs)} satellites fitted "
+            f"in {build_time_s:.1f} s, window from {window_start.isoformat()}"
+        )
+
+    def _itrs(self, tle_pairs, window_start, offsets_s):
+        jd0, fr0 = julian_dates([window_start])
+        jd = np.full(len(offsets_s), jd0[0])
+        fr = fr0[0] + offsets_s / 86400.0
+        batch = propagate_batch(tle_pairs, jd=jd, fr=fr)
+        xyz = teme_to_itrs(batch["position"], jd, fr)["xyz_km"]
+        return np.where((batch["error"] == 0)[..., None], xyz, np.nan)
+
+    def _fit_chunk(self, tle_pairs, window_start):
+        n = self.degree + 1
+        segment_start = np.arange(self.segments) * self.segment_s
+        # Узлы Чебышёва внутри каждого сегмента: (сегменты, узлы)
+        nodes = segment_start[:, None] + (chebyshev_nodes(self.degree) + 1) / 2 * self.segment_s
+        values = self._itrs(tle_pairs, window_start, nodes.ravel())
+        values = values.reshape(len(tle_pairs), self.segments, n, 3)
+        coefficients = np.einsum("jk,nskc->nscj", self._fit_matrix, values)
+
+        # Проверка между узлами против прямого расчёта SGP4
+        checks = segment_start[:, None] + _CHECK_FRACTIONS * self.segment_s
+        expected = self._itrs(tle_pairs, window_start, checks.ravel())
+        expected = expected.reshape(len(tle_pairs), self.segments, len(_CHECK_FRACTIONS), 3)
+        basis = chebyshev_basis(2 * _CHECK_FRACTIONS - 1, self.degree)
+        fitted = np.einsum("nscj,fj->nsfc", coefficients, basis)
+        error = np.linalg.norm(fitted - expected, axis=-1).reshape(len(tle_pairs), -1)
+        max_error = np.where(np.isnan(error).any(axis=1), np.inf, np.nanmax(error, axis=1, initial=0.0))
+        return coefficients, max_error
+
+    def evaluate(self, norad_ids, tle_pairs, start, offsets_s):
+        """ITRS and geodetic positions of cached satellites at ``start + offsets_s``.
+
+        Returns (positions, served): ``served`` is a boolean mask over
+        ``norad_ids`` and the arrays in ``positions`` hold only the served
+        satellites. A satellite is served only if its fit is within tolerance
+        and was made from the same TLE; nothing is served outside the window.
+        """
+        state = self.state
+        served = np.zeros(len(norad_ids), bool)
+        if state.window_start is None:
+            return None, served
+
+        t = (start - state.window_start).total_seconds() + np.asarray(offsets_s, dtype=float)
+        if len(t) == 0 or t.min() < 0 or t.max() > self.segments * self.segment_s:
+            return None, served
+
+        rows = np.array([state.index.get(norad_id, -1) for norad_id in norad_ids], dtype=int)
+        # Пока кэш не перестроен после /fetch_tle, спутники с новым TLE считаются точно
+        served = np.array([row >= 0 and state.tle[row] == pair for row, pair in zip(rows, tle_pairs)], dtype=bool)
+        served[served] = state.max_error[rows[served]] <= self.max_error_km
+        rows = rows[served]
+
+        segment = np.minimum((t // self.segment_s).astype(int), self.segments - 1)
+        x = 2 * (t - segment * self.segment_s) / self.segment_s - 1
+        basis = chebyshev_basis(x, self.degree)
+        xyz = np.einsum("nmcj,mj->nmc", state.coefficients[rows][:, segment], basis)
+        latitude, longitude, altitude = itrs_to_geodetic(xyz)
+        return {
+            "xyz_km": xyz,
+            "latitude_deg": latitude,
+            "longitude_deg": longitude,
+            "altitude_km": altitude,
+        }, served
+
+    def stats(self):
+        state = self.state
+        served = int(np.sum(state.max_error <= self.max_error_km))
+        finite = state.max_error[np.isfinite(state.max_error)]
+        window_stop = state.window_start + timedelta(seconds=self.segments * self.segment_s) \
+            if state.window_start else None
+        return {
+            "ready": state.window_start is not None,
+            "window_start": state.window_start.isoformat() if state.window_start else None,
+            "window_stop": window_stop.isoformat() if window_stop else None,
+            "segment_s": self.segment_s,
+            "degree": self.degree,
+            "objects": len(state.index),
+            "served_objects": served,
+            "max_error_km_limit": self.max_error_km,
+            "max_error_km": float(finite[finite <= self.max_error_km].max()) if served else None,
+            "bytes_per_satellite": self.segments * 3 * (self.degree + 1) * 8,
+            "memory_bytes": int(state.coefficients.nbytes + state.max_error.nbytes),
+            "last_refitted": state.refitted,
+            "build_time_s": state.build_time_s,
+        }
+
+
+ephemeris_cache = ChebyshevEphemeris()
+
+
+def cached_ephemeris(norad_ids, tle_pairs, start, stop, step_seconds, exact=False):
+    """get_ephemeris served from ``ephemeris_cache`` where it covers the request.
+
+    Satellites the cache cannot serve are propagated with SGP4; with ``exact``
+    every satellite is. The result also reports the number of ``cached`` ones.
+    """
+    offsets = np.arange(sample_count(start, stop, step_seconds)) * step_seconds
+    positions, served = (None, np.zeros(len(norad_ids), bool)) if exact else \
+        ephemeris_cache.evaluate(norad_ids, tle_pairs, start, offsets)
+    if not served.any():
+        return {**get_ephemeris(tle_pairs, start, stop, step_seconds), "cached": 0}
+
+    result = {
+        "offsets_s": offsets,
+        "error": np.zeros((len(tle_pairs), len(offsets)), dtype=np.uint8),
+        "xyz_km": np.empty((len(tle_pairs), len(offsets), 3)),
+        "latitude_deg": np.empty((len(tle_pairs), len(offsets))),
+        "longitude_deg": np.empty((len(tle_pairs), len(offsets))),
+        "altitude_km": np.empty((len(tle_pairs), len(offsets))),
+        "cached": int(served.sum()),
+    }
+    for key in ("xyz_km", "latitude_deg", "longitude_deg", "altitude_km"):
+        result[key][served] = positions[key]
+    if not served.all():
+        rest = get_ephemeris([pair for pair, ok in zip(tle_pairs, served) if not ok], start, stop, step_seconds)
+        for key in ("error", "xyz_km", "latitude_deg", "longitude_deg", "altitude_km"):
+            result[key][~served] = rest[key]
+    return result
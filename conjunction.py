@@ -0,0 +1,268 @@
+import os
+import time
+import uuid
+import itertools
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from loguru import logger
+
+from TLE import julian_date_range, propagate_batch, propagate_points
+
+CONJUNCTION_THRESHOLD_KM = float(os.getenv("CONJUNCTION_THRESHOLD_KM", "5"))
+CONJUNCTION_WINDOW_HOURS = float(os.getenv("CONJUNCTION_WINDOW_HOURS", "24"))
+CONJUNCTION_STEP_S = float(os.getenv("CONJUNCTION_STEP_S", "30"))
+# Сколько заданий может ждать или выполняться одновременно: каждое держит свою копию каталога
+CONJUNCTION_MAX_PENDING = int(os.getenv("CONJUNCTION_MAX_PENDING", "2"))
+# Сколько шагов по времени пропагируем по всему каталогу за один вызов SGP4
+TIME_CHUNK_STEPS = 64
+# Верхняя граница относительной скорости двух околоземных объектов, км/с
+MAX_RELATIVE_SPEED_KM_S = 16.0
+# Запас на разницу между средними элементами и оскулирующим радиусом SGP4
+ORBIT_FILTER_MARGIN_KM = 30.0
+# Запас на нелинейность относительного движения в линейном фильтре сближений
+LINEAR_FILTER_MARGIN_KM = 1.0
+GOLDEN_RATIO = (np.sqrt(5) - 1) / 2
+
+# Соседние ячейки "вперёд" по лексикографическому порядку: каждая пара ячеек смотрится один раз
+_HALF_NEIGHBOURS = [(0, 0, 0)] + [
+    offset for offset in itertools.product((-1, 0, 1), repeat=3) if offset > (0, 0, 0)
+]
+
+
+def _radius_limits(orbital_parameters):
+    """Perigee and apogee radii in km from the elements get_orbital_parameters computes."""
+    a = np.array([p["semi_major_axis_km"] for p in orbital_parameters])
+    e = np.array([p["eccentricity"] for p in orbital_parameters])
+    return a * (1 - e), a * (1 + e)
+
+
+def _grid_pairs(position, cell_km):
+    """Pairs (i < j) of objects lying in the same or adjacent cells of a uniform grid."""
+    if len(position) == 0:
+        # Пустой каталог или ошибка SGP4 у всех объектов на этом шаге
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    cells = np.floor(position / cell_km).astype(np.int64)
+    # Сдвигаем индексы так, чтобы соседи крайних ячеек попадали в пустые ячейки, а не в чужие
+    cells -= cells.min(axis=0) - 1
+    dims = cells.max(axis=0) + 2
+    key = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(key, kind="stable")
+    occupied, cell_start, cell_count = np.unique(key[order], return_index=True, return_counts=True)
+    object_cell = np.repeat(np.arange(len(occupied)), cell_count)
+
+    pairs_i, pairs_j = [], []
+    for dx, dy, dz in _HALF_NEIGHBOURS:
+        # Ключ линеен по индексам ячейки, поэтому ключ соседа - это сдвиг на константу
+        neighbour = occupied + (dx * dims[1] + dy) * dims[2] + dz
+        found = np.minimum(np.searchsorted(occupied, neighbour), len(occupied) - 1)
+        matched = occupied[found] == neighbour
+        lo = cell_start[found][object_cell]
+        counts = np.where(matched, cell_count[found], 0)[object_cell]
+        total = counts.sum()
+        if total == 0:
+            continue
+        i = np.repeat(order, counts)
+        j = order[np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(total)]
+        if (dx, dy, dz) == (0, 0, 0):
+            keep = i < j
+            i, j = i[keep], j[keep]
+        pairs_i.append(np.minimum(i, j))
+        pairs_j.append(np.maximum(i, j))
+
+    if not pairs_i:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def _refine_closest_approach(satrecs, i, j, lo, hi, jd0, fr0, tolerance_s=0.01):
+    """Golden-section search for the minimum distance of pairs (i, j) inside [lo, hi] seconds."""
+    def distance(first, second, t):
+        jd = np.full(2 * len(t), jd0)
+        fr = fr0 + np.concatenate([t, t]) / 86400.0
+        position, velocity = propagate_points(satrecs, np.concatenate([first, second]), jd, fr)
+        relative = position[:len(t)] - position[len(t):]
+        relative_velocity = velocity[:len(t)] - velocity[len(t):]
+        return np.linalg.norm(relative, axis=1), np.linalg.norm(relative_velocity, axis=1)
+
+    both_i, both_j = np.concatenate([i, i]), np.concatenate([j, j])
+    while len(lo) and np.max(hi - lo) > tolerance_s:
+        left = hi - GOLDEN_RATIO * (hi - lo)
+        right = lo + GOLDEN_RATIO * (hi - lo)
+        d, _ = distance(both_i, both_j, np.concatenate([left, right]))
+        d = np.nan_to_num(d, nan=np.inf)
+        left_closer = d[:len(lo)] <= d[len(lo):]
+        hi = np.where(left_closer, right, hi)
+        lo = np.where(left_closer, lo, left)
+
+    tca = (lo + hi) / 2
+    miss_distance, relative_speed = distance(i, j, tca)
+    return tca, miss_distance, relative_speed
+
+
+def screen_conjunctions(satellites, start, window_hours=CONJUNCTION_WINDOW_HOURS,
+                        step_s=CONJUNCTION_STEP_S, threshold_km=CONJUNCTION_THRESHOLD_KM):
+    """Find close approaches below threshold_km between catalog objects.
+
+    ``satellites`` is a sequence of (norad_id, tle_line1, tle_line2). The catalog
+    is propagated in time chunks; at every step positions are binned into a
+    uniform grid whose cell covers the threshold plus the distance two objects
+    can close in half a step, so only objects in neighbouring cells are compared.
+    Pairs whose perigee/apogee shells cannot overlap are dropped, the rest are
+    kept only if their linearized approach within the half step is close enough.
+    Each remaining encounter is refined to time and distance of closest
+    approach. Returns (conjunctions, stats).
+    """
+    timings = {"propagation_s": 0.0, "screening_s": 0.0, "refinement_s": 0.0}
+    stop = start + timedelta(hours=window_hours)
+    jd, fr = julian_date_range(start, stop, step_s)
+    screening_km = threshold_km + MAX_RELATIVE_SPEED_KM_S * step_s / 2
+
+    tle_pairs = [(line1, line2) for _, line1, line2 in satellites]
+    satrecs, perigee, apogee = [], None, None
+    candidate_i, candidate_j, candidate_step, candidate_distance = [], [], [], []
+
+    for chunk_start in range(0, len(jd), TIME_CHUNK_STEPS):
+        started = time.perf_counter()
+        chunk = slice(chunk_start, chunk_start + TIME_CHUNK_STEPS)
+        batch = propagate_batch(tle_pairs, jd=jd[chunk], fr=fr[chunk])
+        if perigee is None:
+            satrecs = batch["satrecs"]
+            perigee, apogee = _radius_limits(batch["orbital_parameters"])
+        timings["propagation_s"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        for k in range(batch["position"].shape[1]):
+            valid = np.nonzero(batch["error"][:, k] == 0)[0]
+            position = batch["position"][valid, k]
+            i, j = _grid_pairs(position, screening_km)
+            i, j = valid[i], valid[j]
+
+            overlap = (
+                np.maximum(perigee[i], perigee[j]) - np.minimum(apogee[i], apogee[j])
+                <= threshold_km + ORBIT_FILTER_MARGIN_KM
+            )
+            i, j = i[overlap], j[overlap]
+
+            # Линейное сближение в пределах полушага: кривизна относительного движения
+            # близких объектов за десятки секунд даёт ошибку порядка десятков метров
+            relative = batch["position"][i, k] - batch["position"][j, k]
+            relative_velocity = batch["velocity"][i, k] - batch["velocity"][j, k]
+            speed_sq = np.maximum(np.einsum("ij,ij->i", relative_velocity, relative_velocity), 1e-12)
+            t_min = np.clip(
+                -np.einsum("ij,ij->i", relative, relative_velocity) / speed_sq, -step_s / 2, step_s / 2
+            )
+            distance = np.linalg.norm(relative + relative_velocity * t_min[:, None], axis=1)
+            close = distance < threshold_km + LINEAR_FILTER_MARGIN_KM
+
+            candidate_i.append(i[close])
+            candidate_j.append(j[close])
+            candidate_step.append(np.full(close.sum(), chunk_start + k))
+            candidate_distance.append(distance[close])
+        timings["screening_s"] += time.perf_counter() - started
+
+    stats = {"objects": len(satellites), "steps": len(jd), "candidate_samples": 0, "encounters": 0}
+    if not candidate_i or not sum(len(c) for c in candidate_i):
+        return [], {**stats, **timings}
+
+    started = time.perf_counter()
+    i = np.concatenate(candidate_i)
+    j = np.concatenate(candidate_j)
+    step = np.concatenate(candidate_step)
+    distance = np.concatenate(candidate_distance)
+
+    # Соседние шаги одной пары - одно сближение: берём шаг с минимальной дистанцией
+    order = np.lexsort((step, j, i))
+    i, j, step, distance = i[order], j[order], step[order], distance[order]
+    new_encounter = np.ones(len(i), bool)
+    new_encounter[1:] = (i[1:] != i[:-1]) | (j[1:] != j[:-1]) | (step[1:] != step[:-1] + 1)
+    encounter = np.cumsum(new_encounter) - 1
+    best = np.lexsort((distance, encounter))
+    best = best[np.r_[True, encounter[best][1:] != encounter[best][:-1]]]
+
+    grid_t = step[best] * step_s
+    tca, miss_distance, relative_speed = _refine_closest_approach(
+        satrecs, i[best], j[best],
+        np.maximum(grid_t - step_s, 0.0), np.minimum(grid_t + step_s, (len(jd) - 1) * step_s),
+        jd[0], fr[0]
+    )
+    timings["refinement_s"] = time.perf_counter() - started
+
+    conjunctions = []
+    for k in np.argsort(miss_distance):
+        if not miss_distance[k] < threshold_km:
+            continue
+        conjunctions.append({
+            "norad_id_1": satellites[i[best][k]][0],
+            "norad_id_2": satellites[j[best][k]][0],
+            "tca": (start + timedelta(seconds=float(tca[k]))).isoformat(),
+            "miss_distance_km": float(miss_distance[k]),
+            "relative_speed_km_s": float(relative_speed[k]),
+        })
+
+    stats.update(candidate_samples=len(i), encounters=len(best))
+    return conjunctions, {**stats, **timings}
+
+
+class ScreeningJobs:
+    """In-process registry of conjunction screening jobs, executed one at a time."""
+
+    def __init__(self, max_jobs=20, max_pending=CONJUNCTION_MAX_PENDING):
+        self.max_jobs = max_jobs
+        self.max_pending = max_pending
+        self._jobs = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conjunctions")
+
+    def pending(self):
+        """Number of queued and running jobs."""
+        return sum(job["status"] in ("queued", "running") for job in list(self._jobs.values()))
+
+    def full(self):
+        return self.pending() >= self.max_pending
+
+    def submit(self, satellites, start, window_hours, step_s, threshold_km):
+        """Queue a screening run; returns its job id, or None if ``max_pending`` jobs are in progress."""
+        if self.full():
+            return None
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "parameters": {
+                "start": start.isoformat(),
+                "window_hours": window_hours,
+                "step_s": step_s,
+                "threshold_km": threshold_km,
+            },
+            "submitted_at": datetime.utcnow().isoformat(),
+        }
+        while len(self._jobs) > self.max_jobs:
+            oldest = next(iter(self._jobs))
+            if self._jobs[oldest]["status"] in ("queued", "running"):
+                break
+            self._jobs.popitem(last=False)
+
+        self._executor.submit(self._run, job_id, satellites, start, window_hours, step_s, threshold_km)
+        return job_id
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def _run(self, job_id, satellites, start, window_hours, step_s, threshold_km):
+        job = self._jobs[job_id]
+        job["status"] = "running"
+        started = time.perf_counter()
+        try:
+            conjunctions, stats = screen_conjunctions(
+                satellites, start, window_hours, step_s, threshold_km
+            )
+            job.update(status="done", conjunctions=conjunctions, stats=stats)
+        except Exception as e:
+            logger.error(f"Conjunction screening {job_id} failed: {e}")
+            job.update(status="failed", error=str(e))
+        job["runtime_s"] = time.perf_counter() - started
+        logger.info(f"Conjunction screening {job_id} {job['status']} in {job['runtime_s']:.1f} s")
+
+
+screening_jobs = ScreeningJobs()
@@ -0,0 +1,170 @@
+import struct
+import hashlib
+import numpy as np
+from datetime import datetime
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+from metrics import timed
+
+try:
+    import msgpack
+except ImportError:  # MessagePack необязателен: без него доступны только JSON и packed
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+PACKED_MEDIA_TYPE = "application/x-satellite-packed"
+
+PACKED_MAGIC = b"SATP"
+PACKED_VERSION = 1
+# magic, версия, размер float в байтах, число колонок, число записей, длина таблицы строк
+PACKED_HEADER = struct.Struct("<4sBBHII")
+
+UNIX_EPOCH = datetime(1970, 1, 1)
+
+_PACKED_DTYPES = {"float32": np.dtype("<f4"), "float64": np.dtype("<f8")}
+
+ORBIT_DATA_COLUMNS = (
+    "x", "y", "z", "latitude_deg", "longitude_deg", "altitude_km",
+    "semi_major_axis_km", "eccentricity", "inclination_deg", "right_ascension_deg",
+    "argument_perigee_deg", "mean_anomaly_deg",
+)
+
+
+def negotiate(request: Request):
+    """Pick the response format from the Accept header: (media_type, dtype).
+
+    JSON wins ties and is returned when nothing supported is asked for. The
+    packed format takes an optional ``dtype=float32|float64`` parameter.
+    """
+    supported = [JSON_MEDIA_TYPE, PACKED_MEDIA_TYPE] + ([MSGPACK_MEDIA_TYPE] if msgpack else [])
+    best, best_q, dtype = JSON_MEDIA_TYPE, 0.0, _PACKED_DTYPES["float64"]
+
+    for media_range in request.headers.get("accept", "").split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        params = dict(p.split("=", 1) for p in params if "=" in p)
+        try:
+            q = float(params.get("q", 1))
+        except ValueError:
+            continue
+        media_type = media_type.lower()
+        if media_type == "application/x-msgpack":
+            media_type = MSGPACK_MEDIA_TYPE
+        if media_type not in supported or q < best_q or (q == best_q and media_type != JSON_MEDIA_TYPE):
+            continue
+        best, best_q = media_type, q
+        if media_type == PACKED_MEDIA_TYPE:
+            dtype = _PACKED_DTYPES.get(params.get("dtype", "float64"), dtype)
+
+    return best, dtype
+
+
+def pack(labels, columns, dtype=np.dtype("<f8")):
+    """Encode a table in the packed binary layout.
+
+    Layout (little-endian): 16-byte header ``PACKED_HEADER``, then a UTF-8
+    string table - the first line holds comma-separated column names, the next
+    lines one label per record - padded to 8 bytes, then the columns one after
+    another as float arrays of one value per record. A table without
+    ``labels`` takes its record count from the columns and has no label lines.
+    """
+    names = list(columns)
+    labels = list(labels)
+    count = len(labels) if labels or not names else len(columns[names[0]])
+    strings = "\n".join([",".join(names)] + labels).encode()
+    header = PACKED_HEADER.pack(
+        PACKED_MAGIC, PACKED_VERSION, dtype.itemsize, len(names), count, len(strings)
+    )
+    padding = b"\0" * (-(len(header) + len(strings)) % 8)
+    body = np.empty((len(names), count), dtype)
+    for row, name in enumerate(names):
+        body[row] = columns[name]
+    return b"".join([header, strings, padding, body.tobytes()])
+
+
+def unpack(payload):
+    """Decode a packed payload into (labels, {column: array}); used by Python clients."""
+    magic, version, itemsize, column_count, count, strings_length = PACKED_HEADER.unpack_from(payload)
+    if magic != PACKED_MAGIC or version != PACKED_VERSION:
+        raise ValueError("Not a packed satellite payload")
+
+    offset = PACKED_HEADER.size
+    lines = payload[offset:offset + strings_length].decode().split("\n")
+    names = lines[0].split(",") if column_count else []
+    offset += strings_length
+    offset += -offset % 8
+
+    dtype = np.dtype("<f4") if itemsize == 4 else np.dtype("<f8")
+    body = np.frombuffer(payload, dtype, count=column_count * count, offset=offset)
+    body = body.reshape(column_count, count)
+    return lines[1:1 + count], {name: body[i] for i, name in enumerate(names)}
+
+
+def orbit_data_table(satellites):
+    """/orbit_data entries as packed labels "norad_id<TAB>name" and ORBIT_DATA_COLUMNS."""
+    labels = [f"{sat['norad_id']}\t{sat['name']}" for sat in satellites]
+    values = [
+        (
+            *(orbit["position"][axis] for axis in ("x", "y", "z")),
+            *(orbit["current_lat_lon_alt"][key] for key in ("latitude_deg", "longitude_deg", "altitude_km")),
+            *(orbit["orbital_parameters"][key] for key in ORBIT_DATA_COLUMNS[6:]),
+        )
+        for orbit in (sat["orbit_data"] for sat in satellites)
+    ]
+    table = np.array(values, dtype=np.float64).reshape(len(values), len(ORBIT_DATA_COLUMNS))
+    return labels, {name: table[:, i] for i, name in enumerate(ORBIT_DATA_COLUMNS)}
+
+
+def catalog_table(satellites, fields):
+    """Projected satellite rows as packed labels and update times.
+
+    Labels are the selected text fields joined with tabs (by default
+    "norad_id<TAB>name<TAB>tle_line1<TAB>tle_line2"); ``updated_at`` becomes the
+    ``updated_at_unix`` column, which needs dtype=float64 for one-second precision.
+    """
+    text_fields = [i for i, field in enumerate(fields) if field != "updated_at"]
+    labels = ["\t".join(row[i] for i in text_fields) for row in satellites]
+    if "updated_at" not in fields:
+        return labels, {}
+    column = fields.index("updated_at")
+    # updated_at хранится в UTC без часового пояса
+    updated_at = [(row[column] - UNIX_EPOCH).total_seconds() for row in satellites]
+    return labels, {"updated_at_unix": updated_at}
+
+
+def track_table(xyz):
+    """Orbit track points as unlabeled packed columns x, y, z (NaN for missing points)."""
+    return [], {axis: xyz[:, i] for i, axis in enumerate("xyz")}
+
+
+def entity_tag(*parts):
+    """Strong ETag built from the representation inputs (data version, query, media type)."""
+    digest = hashlib.blake2b("\n".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag):
+    """True if the request's If-None-Match lists ``etag`` (or "*")."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def negotiated_response(request: Request, content, packed, headers=None):
+    """Return ``content`` as JSON, MessagePack or the packed layout.
+
+    ``packed`` is called only when the client asked for the packed format and
+    must return (labels, columns).
+    """
+    media_type, dtype = negotiate(request)
+    headers = {"Vary": "Accept", **(headers or {})}
+    with timed("serialize"):
+        if media_type == PACKED_MEDIA_TYPE:
+            labels, columns = packed()
+            return Response(pack(labels, columns, dtype), media_type=media_type, headers=headers)
+        if media_type == MSGPACK_MEDIA_TYPE:
+            return Response(msgpack.packb(content), media_type=media_type, headers=headers)
+        return JSONResponse(content, headers=headers)
@@ -1,28 +1,70 @@
-from fastapi import FastAPI, HTTPException, Request, Depends, Query, Cookie
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Depends, Query, Cookie, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from loguru import logger
-import requests
+import asyncio
+import time
 from dotenv import load_dotenv
 import os
-from datetime import datetime
-from typing import List
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+load_dotenv("config.env")
 
 # Local imports
-from TLE import get_orbit_and_position
-from ayth import auth_router
-from database import get_db
-from models import Satellite, User, AuthToken, UserSatellite
+from TLE import get_orbit_and_position, get_orbits_and_positions, sample_count
+from ayth import auth_router, get_current_user_id, resolve_token, run_token_cleanup
+from catalog import (
+    refresher, catalog_fields, catalog_version, catalog_changes, catalog_query, catalog_row,
+    stream_catalog_json, satellite_search, catalog_rows_for, ORBIT_REGIMES
+)
+from passes import predict_passes
+from stream import position_streamer
+from snapshot import catalog_snapshot
+from propagation import propagation_pool, PROPAGATION_WORKERS
+from chebyshev import ephemeris_cache, cached_ephemeris
+from typeahead import typeahead_index, typeahead_query
+from orbit_track import orbit_track_cache, track_content, track_start, ORBIT_TRACK_LODS
+from metrics import metrics_middleware, render_metrics, slow_requests, timed
+from formats import (
+    JSON_MEDIA_TYPE, negotiate, negotiated_response, entity_tag, etag_matches,
+    orbit_data_table, catalog_table, track_table
+)
+from conjunction import (
+    screening_jobs, CONJUNCTION_THRESHOLD_KM, CONJUNCTION_WINDOW_HOURS, CONJUNCTION_STEP_S
+)
+from database import get_async_db, async_engine
+from models import Satellite, UserSatellite
 
 # Initialize FastAPI
 app = FastAPI()
 app.include_router(auth_router, prefix="/auth")
+app.middleware("http")(metrics_middleware)
 
 # Configuration
 templates = Jinja2Templates(directory="html")
-load_dotenv("config.env")
-TLE_URL = "https://celestrak.org/NORAD/elements/gp.php?GROUP=active&FORMAT=tle"
+
+# Верхняя граница числа точек (спутники x моменты времени) в ответе /ephemeris
+EPHEMERIS_MAX_SAMPLES = int(os.getenv("EPHEMERIS_MAX_SAMPLES", "50000"))
+
+# Максимальный размер страницы /get_all_satellites
+CATALOG_PAGE_MAX_LIMIT = int(os.getenv("CATALOG_PAGE_MAX_LIMIT", "10000"))
+
+# Максимум подсказок в ответе /satellites/typeahead
+TYPEAHEAD_MAX_LIMIT = int(os.getenv("TYPEAHEAD_MAX_LIMIT", "100"))
+
+# Максимальная длина окна прогноза пролётов в часах
+PASSES_MAX_WINDOW_HOURS = float(os.getenv("PASSES_MAX_WINDOW_HOURS", "48"))
+
+
+def utc_naive(value):
+    """Query datetime as naive UTC, the form the database and SGP4 code use; aware values are converted."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
 
 # Logger setup
 logger.add("satellites_log.log", level="DEBUG", encoding="utf-8")
@@ -38,6 +80,26 @@ async def startup():
         logger.error(f"Database initialization failed: {e}")
         raise
 
+    if PROPAGATION_WORKERS > 0:
+        # Процессы пула поднимаются до первого снимка каталога, который раскладывает по ним TLE
+        await asyncio.to_thread(propagation_pool.start)
+    refresher.start()
+    catalog_snapshot.start()
+    ephemeris_cache.start()
+    typeahead_index.start()
+    app.state.token_cleanup = asyncio.create_task(run_token_cleanup())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await refresher.stop()
+    await catalog_snapshot.stop()
+    await ephemeris_cache.stop()
+    await typeahead_index.stop()
+    app.state.token_cleanup.cancel()
+    await async_engine.dispose()
+    propagation_pool.shutdown()
+
 
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
@@ -54,41 +116,11 @@ async def main_page(request: Request):
 
 
 @app.get("/fetch_tle")
-async def fetch_tle(db: Session = Depends(get_db)):
+async def fetch_tle():
     """Fetch and update TLE data from external source"""
     try:
-        response = requests.get(TLE_URL)
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail="Error loading TLE data")
-
-        tle_data = response.text.splitlines()
-        for i in range(0, len(tle_data), 3):
-            if i + 2 >= len(tle_data):
-                break
-
-            satellite_name = tle_data[i].strip()
-            line1 = tle_data[i + 1].strip()
-            line2 = tle_data[i + 2].strip()
-            norad_id = line2.split()[1]
-
-            # Upsert satellite data
-            satellite = db.query(Satellite).filter(Satellite.norad_id == norad_id).first()
-            if not satellite:
-                satellite = Satellite(
-                    norad_id=norad_id,
-                    name=satellite_name,
-                    tle_line1=line1,
-                    tle_line2=line2
-                )
-                db.add(satellite)
-            else:
-                satellite.tle_line1 = line1
-                satellite.tle_line2 = line2
-                satellite.updated_at = datetime.utcnow()
-
-            db.commit()
-
-        return {"status": "TLE data updated successfully"}
+        # Присоединяемся к уже идущему обновлению; shield не даёт отключившемуся клиенту его отменить
+        return await asyncio.shield(refresher.refresh())
 
     except Exception as e:
         logger.error(f"TLE update failed: {e}")
@@ -98,72 +130,201 @@ async def fetch_tle(db: Session = Depends(get_db)):
 @app.post("/track_satellite/{norad_id}")
 async def track_satellite(
     norad_id: str,
-    db: Session = Depends(get_db),
-    auth_token: str = Cookie(None, alias="auth_token")
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """Track satellite for authenticated user"""
-    if not auth_token:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-
-    user = db.query(User).join(AuthToken).filter(
-        AuthToken.token == auth_token,
-        AuthToken.expires_at > datetime.utcnow()
-    ).first()
-
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    satellite = db.query(Satellite).filter(Satellite.norad_id == norad_id).first()
+    satellite = await db.get(Satellite, norad_id)
     if not satellite:
         raise HTTPException(status_code=404, detail="Satellite not found")
 
     # Проверяем существующую связь
-    existing = db.query(UserSatellite).filter_by(
-        user_id=user.id,
-        norad_id=norad_id
-    ).first()
+    existing = await db.get(UserSatellite, (user_id, norad_id))
 
     if not existing:
         new_tracking = UserSatellite(
-            user_id=user.id,
+            user_id=user_id,
             norad_id=norad_id,
             created_at=datetime.utcnow()
         )
         db.add(new_tracking)
-        db.commit()
+        await db.commit()
 
     return {"status": f"Tracking satellite {norad_id}"}
 
 @app.get("/get_all_satellites")
-async def get_all_satellites(db: Session = Depends(get_db)):
+async def get_all_satellites(
+        request: Request,
+        fields: Optional[str] = Query(None, description="Comma-separated fields, e.g. norad_id,name"),
+        after: Optional[str] = Query(None, description="Return satellites with NORAD ID after this one"),
+        limit: Optional[int] = Query(None, ge=1, le=CATALOG_PAGE_MAX_LIMIT),
+        stream: bool = Query(False, description="Stream rows from a server-side cursor"),
+        db: AsyncSession = Depends(get_async_db)
+):
     """
     Получение списка всех спутников из базы данных
     """
     try:
-        satellites = db.query(Satellite).all()
-        return [
-            {
-                "norad_id": sat.norad_id,
-                "name": sat.name,
-                "tle_line1": sat.tle_line1,
-                "tle_line2": sat.tle_line2,
-                "updated_at": sat.updated_at.isoformat()
-            }
-            for sat in satellites
-        ]
+        selected = catalog_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        # ETag зависит от версии каталога, параметров запроса и формата ответа
+        media_type = JSON_MEDIA_TYPE if stream else negotiate(request)[0]
+        etag = entity_tag(await db.run_sync(catalog_version), request.url.query, media_type)
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        if stream:
+            return StreamingResponse(
+                stream_catalog_json(selected, after, limit), media_type=JSON_MEDIA_TYPE, headers=headers
+            )
+
+        # Для курсора следующей страницы norad_id читаем, даже если его нет в проекции
+        query_fields = selected if limit is None or "norad_id" in selected else selected + ["norad_id"]
+        satellites = await db.run_sync(
+            lambda session: catalog_query(session, query_fields, after, limit).all()
+        )
+        if limit is not None and len(satellites) == limit:
+            headers["X-Next-After"] = satellites[-1].norad_id
+
+        content = [catalog_row(sat, selected) for sat in satellites]
+        return negotiated_response(
+            request, content, lambda: catalog_table(satellites, selected), headers
+        )
     except Exception as e:
         logger.error(f"Error fetching satellites: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.get("/catalog/changes")
+async def get_catalog_changes(
+        since: int = Query(0, ge=0, description="Catalog version the client already has"),
+        limit: int = Query(CATALOG_PAGE_MAX_LIMIT, ge=1, le=CATALOG_PAGE_MAX_LIMIT),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Спутники, добавленные, изменённые или удалённые после версии каталога since
+    """
+    try:
+        changes, version, has_more = await db.run_sync(catalog_changes, since, limit)
+    except Exception as e:
+        logger.error(f"Error fetching catalog changes: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    # Если has_more, клиент повторяет запрос с since=version
+    return {"version": version, "has_more": has_more, "changes": changes}
+
+@app.get("/satellites/search")
+async def search_satellites(
+        regime: Optional[str] = Query(None, description=f"One of: {', '.join(ORBIT_REGIMES)}"),
+        min_period: Optional[float] = Query(None, description="Orbital period, minutes"),
+        max_period: Optional[float] = Query(None),
+        min_inclination: Optional[float] = Query(None, description="Inclination, deg"),
+        max_inclination: Optional[float] = Query(None),
+        min_eccentricity: Optional[float] = Query(None),
+        max_eccentricity: Optional[float] = Query(None),
+        min_perigee: Optional[float] = Query(None, description="Perigee altitude, km"),
+        max_perigee: Optional[float] = Query(None),
+        min_apogee: Optional[float] = Query(None, description="Apogee altitude, km"),
+        max_apogee: Optional[float] = Query(None),
+        min_raan: Optional[float] = Query(None, description="Right ascension of the ascending node, deg"),
+        max_raan: Optional[float] = Query(None),
+        epoch_after: Optional[datetime] = Query(None, description="TLE epoch not earlier than, UTC"),
+        epoch_before: Optional[datetime] = Query(None),
+        after: Optional[str] = Query(None, description="Return satellites with NORAD ID after this one"),
+        limit: int = Query(1000, ge=1, le=CATALOG_PAGE_MAX_LIMIT),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Спутники, элементы орбиты которых попадают в заданные диапазоны; фильтр выполняется в SQL
+    """
+    if regime is not None and regime not in ORBIT_REGIMES:
+        raise HTTPException(status_code=400, detail=f"Unknown regime {regime}; allowed: {', '.join(ORBIT_REGIMES)}")
+
+    # Явные границы сужают диапазоны выбранного типа орбиты
+    ranges = dict(ORBIT_REGIMES.get(regime, {}))
+    for field, low, high in (
+            ("period_min", min_period, max_period),
+            ("inclination_deg", min_inclination, max_inclination),
+            ("eccentricity", min_eccentricity, max_eccentricity),
+            ("perigee_km", min_perigee, max_perigee),
+            ("apogee_km", min_apogee, max_apogee),
+            ("raan_deg", min_raan, max_raan),
+            ("epoch", utc_naive(epoch_after), utc_naive(epoch_before)),
+    ):
+        regime_low, regime_high = ranges.get(field, (None, None))
+        ranges[field] = (
+            low if regime_low is None else regime_low if low is None else max(low, regime_low),
+            high if regime_high is None else regime_high if high is None else min(high, regime_high),
+        )
+
+    try:
+        satellites = await db.run_sync(satellite_search, ranges, after, limit)
+    except Exception as e:
+        logger.error(f"Error searching satellites: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    return {
+        "count": len(satellites),
+        "next_after": satellites[-1]["norad_id"] if len(satellites) == limit else None,
+        "satellites": satellites,
+    }
+
+@app.get("/satellites/typeahead")
+async def typeahead_satellites(
+        q: str = Query(..., min_length=1, max_length=64, description="Part of a name or NORAD ID"),
+        limit: int = Query(10, ge=1, le=TYPEAHEAD_MAX_LIMIT),
+        fields: Optional[str] = Query(None, description="Extra catalog fields of the results, e.g. tle_line1,tle_line2"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Подсказки поиска по названию и NORAD ID, лучшие совпадения первыми
+    """
+    try:
+        extra = [field for field in catalog_fields(fields) if field not in ("norad_id", "name")] if fields else []
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if typeahead_index.ready:
+            source = "index"
+            with timed("typeahead_search"):
+                satellites = typeahead_index.search(q, limit)
+        else:
+            # Индекс ещё строится после старта: ищем в базе
+            source = "database"
+            satellites = await db.run_sync(typeahead_query, q, limit)
+
+        if extra and satellites:
+            details = await db.run_sync(catalog_rows_for, extra, [sat["norad_id"] for sat in satellites])
+            # Спутник мог быть удалён после построения индекса
+            satellites = [{**sat, **details[sat["norad_id"]]} for sat in satellites if sat["norad_id"] in details]
+    except Exception as e:
+        logger.error(f"Error in typeahead search: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    return {"query": q, "source": source, "count": len(satellites), "satellites": satellites}
+
+
+@app.get("/satellites/typeahead/stats")
+async def get_typeahead_stats():
+    """Size, build time and catalog version of the typeahead index"""
+    return typeahead_index.stats()
+
 @app.get("/my_satellites")
 async def get_my_satellites(
-        db: Session = Depends(get_db),
-        auth_token: str = Cookie(None, alias="auth_token")
+        db: AsyncSession = Depends(get_async_db),
+        user_id: int = Depends(get_current_user_id)
 ):
     """Get tracked satellites for authenticated user"""
-    user = db.query(User).join(AuthToken).filter(AuthToken.token == auth_token).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+    result = await db.execute(
+        select(Satellite.norad_id, Satellite.name, Satellite.updated_at)
+        .join(UserSatellite, UserSatellite.norad_id == Satellite.norad_id)
+        .where(UserSatellite.user_id == user_id)
+    )
+    satellites = result.all()
 
     return {
         "tracked_satellites": [
@@ -172,15 +333,67 @@ async def get_my_satellites(
                 "name": sat.name,
                 "last_update": sat.updated_at.isoformat()
             }
-            for sat in user.satellites
+            for sat in satellites
         ]
     }
 
 
+
+@app.get("/my_satellites/positions")
+async def get_my_satellites_positions(
+        request: Request,
+        exact: bool = Query(False, description="Propagate now instead of reading the catalog snapshot"),
+        db: AsyncSession = Depends(get_async_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    """Positions and orbital parameters of all satellites tracked by the user in one response"""
+    try:
+        # Один запрос: связь пользователя со спутниками и нужные колонки спутника, без ORM-объектов
+        with timed("db_lookup"):
+            tracked = (await db.execute(
+                select(Satellite.norad_id, Satellite.name, Satellite.tle_line1, Satellite.tle_line2)
+                .join(UserSatellite, UserSatellite.norad_id == Satellite.norad_id)
+                .where(UserSatellite.user_id == user_id, Satellite.removed_at.is_(None))
+                .order_by(Satellite.norad_id)
+            )).all()
+
+        satellites_data = {}
+        if not exact:
+            with timed("snapshot_lookup", len(tracked)):
+                for sat in tracked:
+                    entry = catalog_snapshot.get(sat.norad_id)
+                    if entry:
+                        satellites_data[sat.norad_id] = entry
+        missing = [sat for sat in tracked if sat.norad_id not in satellites_data]
+
+        if missing:
+            # Остальные спутники считаются одним векторизованным расчётом
+            orbits = get_orbits_and_positions(
+                [(sat.tle_line1, sat.tle_line2) for sat in missing],
+                datetime.utcnow()
+            )
+            for sat, orbit_data in zip(missing, orbits):
+                if orbit_data is None:
+                    logger.error(f"Error processing {sat.norad_id}: propagation failed")
+                    continue
+                satellites_data[sat.norad_id] = {"norad_id": sat.norad_id, "name": sat.name, "orbit_data": orbit_data}
+
+        satellites = [satellites_data[sat.norad_id] for sat in tracked if sat.norad_id in satellites_data]
+        return negotiated_response(
+            request, {"satellites": satellites}, lambda: orbit_data_table(satellites)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in my_satellites/positions endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @app.get("/orbit_data")
 async def get_orbit_data(
+        request: Request,
         norad_ids: str = Query(..., description="Comma-separated NORAD IDs"),
-        db: Session = Depends(get_db),
+        exact: bool = Query(False, description="Propagate now instead of reading the catalog snapshot"),
+        db: AsyncSession = Depends(get_async_db),
         auth_token: str = Cookie(None, alias="auth_token")
 ):
     try:
@@ -190,45 +403,232 @@ async def get_orbit_data(
         # Получаем список NORAD ID
         norad_list = norad_ids.split(',')
 
-        satellites_data = []
-        for norad_id in norad_list:
-            satellite = db.query(Satellite).filter(Satellite.norad_id == norad_id).first()
-            if not satellite:
-                continue
-
-            try:
-                orbit_data = get_orbit_and_position(
-                    satellite.tle_line1,
-                    satellite.tle_line2,
-                    datetime.utcnow()
-                )
-            except Exception as e:
-                logger.error(f"Error processing {norad_id}: {str(e)}")
-                continue
-
-            satellites_data.append({
-                "norad_id": satellite.norad_id,
-                "name": satellite.name,
-                "orbit_data": orbit_data
-            })
-
-        return {"satellites": satellites_data}
+        # Сначала берём позиции из общего снимка каталога, остальное считаем сразу
+        satellites_data = {}
+        if not exact:
+            with timed("snapshot_lookup", len(norad_list)):
+                for norad_id in norad_list:
+                    entry = catalog_snapshot.get(norad_id)
+                    if entry:
+                        satellites_data[norad_id] = entry
+        missing = [norad_id for norad_id in norad_list if norad_id not in satellites_data]
+
+        if missing:
+            # Один запрос к БД и один векторизованный расчёт на все спутники
+            with timed("db_lookup", len(missing)):
+                satellites = (await db.scalars(
+                    select(Satellite).where(Satellite.norad_id.in_(missing), Satellite.removed_at.is_(None))
+                )).all()
+            orbits = get_orbits_and_positions(
+                [(sat.tle_line1, sat.tle_line2) for sat in satellites],
+                datetime.utcnow()
+            )
+
+            for satellite, orbit_data in zip(satellites, orbits):
+                if orbit_data is None:
+                    logger.error(f"Error processing {satellite.norad_id}: propagation failed")
+                    continue
+
+                satellites_data[satellite.norad_id] = {
+                    "norad_id": satellite.norad_id,
+                    "name": satellite.name,
+                    "orbit_data": orbit_data
+                }
+
+        satellites = [satellites_data[n] for n in norad_list if n in satellites_data]
+        return negotiated_response(
+            request, {"satellites": satellites}, lambda: orbit_data_table(satellites)
+        )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in orbit_data endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/ephemeris")
+async def get_ephemeris_data(
+        norad_ids: str = Query(..., description="Comma-separated NORAD IDs"),
+        start: Optional[datetime] = Query(None, description="UTC start, defaults to now"),
+        stop: Optional[datetime] = Query(None, description="UTC stop, defaults to start + 10 minutes"),
+        step: float = Query(10.0, gt=0, description="Step in seconds"),
+        exact: bool = Query(False, description="Propagate with SGP4 instead of reading the Chebyshev cache"),
+        db: AsyncSession = Depends(get_async_db),
+        auth_token: str = Cookie(None, alias="auth_token")
+):
+    """Trajectory (ITRS xyz and lat/lon/alt) of each satellite on a time grid"""
+    if not auth_token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    start = utc_naive(start) or datetime.utcnow()
+    stop = utc_naive(stop) or start + timedelta(minutes=10)
+    if stop < start:
+        raise HTTPException(status_code=400, detail="stop must not be earlier than start")
+
+    norad_list = norad_ids.split(',')
+    # Тот же счёт точек, что и у сетки расчёта, иначе лимит проверялся бы на другом числе
+    samples = sample_count(start, stop, step)
+    if samples * len(norad_list) > EPHEMERIS_MAX_SAMPLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many samples: {samples * len(norad_list)} > {EPHEMERIS_MAX_SAMPLES}"
+        )
+
+    satellites = (await db.scalars(
+        select(Satellite).where(Satellite.norad_id.in_(norad_list), Satellite.removed_at.is_(None))
+    )).all()
+    satellites_by_id = {sat.norad_id: sat for sat in satellites}
+    satellites = [satellites_by_id[norad_id] for norad_id in norad_list if norad_id in satellites_by_id]
+
+    try:
+        ephemeris = cached_ephemeris(
+            [sat.norad_id for sat in satellites], [(sat.tle_line1, sat.tle_line2) for sat in satellites],
+            start, stop, step, exact=exact
+        )
+    except Exception as e:
+        logger.error(f"Error in ephemeris endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error calculating ephemeris")
+
+    satellites_data = []
+    for i, satellite in enumerate(satellites):
+        valid = ephemeris["error"][i] == 0
+
+        def column(values):
+            # Точки, где SGP4 вернул ошибку, отдаём как null
+            return [value if ok else None for value, ok in zip(values.tolist(), valid)]
+
+        satellites_data.append({
+            "norad_id": satellite.norad_id,
+            "name": satellite.name,
+            "x_km": column(ephemeris["xyz_km"][i, :, 0]),
+            "y_km": column(ephemeris["xyz_km"][i, :, 1]),
+            "z_km": column(ephemeris["xyz_km"][i, :, 2]),
+            "latitude_deg": column(ephemeris["latitude_deg"][i]),
+            "longitude_deg": column(ephemeris["longitude_deg"][i]),
+            "altitude_km": column(ephemeris["altitude_km"][i]),
+        })
+
+    return {
+        "start": start.isoformat(),
+        "step_seconds": step,
+        "offsets_s": ephemeris["offsets_s"].tolist(),
+        "cached": ephemeris["cached"],
+        "satellites": satellites_data
+    }
+
+@app.get("/ephemeris/cache/stats")
+async def get_ephemeris_cache_stats():
+    """Window, fit error and memory use of the Chebyshev ephemeris cache"""
+    return ephemeris_cache.stats()
+
+@app.get("/passes")
+async def get_passes(
+        lat: float = Query(..., ge=-90, le=90, description="Observer latitude, deg"),
+        lon: float = Query(..., ge=-180, le=360, description="Observer longitude, deg"),
+        alt: float = Query(0.0, description="Observer altitude, km"),
+        start: Optional[datetime] = Query(None, description="UTC start, defaults to now"),
+        stop: Optional[datetime] = Query(None, description="UTC stop, defaults to start + 24 hours"),
+        min_elevation: float = Query(10.0, ge=0, lt=90, description="Minimum elevation, deg"),
+        norad_ids: Optional[str] = Query(None, description="Comma-separated NORAD IDs, whole catalog if omitted"),
+        db: AsyncSession = Depends(get_async_db),
+        auth_token: str = Cookie(None, alias="auth_token")
+):
+    """AOS/TCA/LOS and maximum elevation of passes over a ground station"""
+    if not auth_token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    start = utc_naive(start) or datetime.utcnow()
+    stop = utc_naive(stop) or start + timedelta(hours=24)
+    if not start < stop <= start + timedelta(hours=PASSES_MAX_WINDOW_HOURS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Window must be positive and at most {PASSES_MAX_WINDOW_HOURS} hours"
+        )
+
+    query = select(Satellite.norad_id, Satellite.tle_line1, Satellite.tle_line2) \
+        .where(Satellite.removed_at.is_(None))
+    if norad_ids:
+        query = query.where(Satellite.norad_id.in_(norad_ids.split(',')))
+    satellites = [tuple(row) for row in (await db.execute(query)).all()]
+
+    started = time.perf_counter()
+    try:
+        # Расчёт по всему каталогу занимает секунды: не держим event loop
+        passes = await asyncio.to_thread(
+            predict_passes, satellites, lat, lon, alt, start, stop, min_elevation
+        )
+    except Exception as e:
+        logger.error(f"Error in passes endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error predicting passes")
+
+    return {
+        "observer": {"latitude_deg": lat, "longitude_deg": lon, "altitude_km": alt},
+        "start": start.isoformat(),
+        "stop": stop.isoformat(),
+        "min_elevation_deg": min_elevation,
+        "satellites": len(satellites),
+        "elapsed_s": time.perf_counter() - started,
+        "passes": passes
+    }
+
+@app.post("/conjunctions")
+async def start_conjunction_screening(
+        threshold_km: float = Query(CONJUNCTION_THRESHOLD_KM, gt=0, le=100),
+        window_hours: float = Query(CONJUNCTION_WINDOW_HOURS, gt=0, le=168),
+        step_s: float = Query(CONJUNCTION_STEP_S, ge=1, le=120),
+        start: Optional[datetime] = Query(None, description="UTC start, defaults to now"),
+        db: AsyncSession = Depends(get_async_db),
+        user_id: int = Depends(get_current_user_id)
+):
+    """Queue a catalog-wide close-approach screening job"""
+    # Каждое задание держит копию каталога: лишние отклоняем до его загрузки
+    busy = HTTPException(
+        status_code=503,
+        detail="Too many screening jobs in progress, retry later",
+        headers={"Retry-After": "60"}
+    )
+    if screening_jobs.full():
+        raise busy
+
+    result = await db.execute(
+        select(Satellite.norad_id, Satellite.tle_line1, Satellite.tle_line2)
+        .where(Satellite.removed_at.is_(None))
+    )
+    satellites = [tuple(row) for row in result.all()]
+    start = utc_naive(start) or datetime.utcnow()
+    job_id = screening_jobs.submit(satellites, start, window_hours, step_s, threshold_km)
+    if job_id is None:
+        raise busy
+    logger.info(f"Conjunction screening {job_id} queued by user {user_id}")
+    return {"job_id": job_id, "status": "queued", "objects": len(satellites)}
+
+
+@app.get("/conjunctions/{job_id}")
+async def get_conjunction_screening(job_id: str):
+    """Status, runtime and results of a screening job"""
+    job = screening_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.get("/satellite/{norad_id}")
 async def get_single_satellite(
     norad_id: str,
-    db: Session = Depends(get_db),
+    exact: bool = Query(False, description="Propagate now instead of reading the catalog snapshot"),
+    db: AsyncSession = Depends(get_async_db),
     auth_token: str = Cookie(None, alias="auth_token")
 ):
     if not auth_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    satellite = db.query(Satellite).filter(Satellite.norad_id == norad_id).first()
-    if not satellite:
+    entry = None if exact else catalog_snapshot.get(norad_id)
+    if entry:
+        return {**entry, "position": entry["orbit_data"]["position"]}
+
+    with timed("db_lookup", 1):
+        satellite = await db.get(Satellite, norad_id)
+    # Снятые с каталога спутники не отдаём, как и в списках
+    if not satellite or satellite.removed_at is not None:
         raise HTTPException(status_code=404, detail="Satellite not found")
 
     try:
@@ -248,32 +648,113 @@ async def get_single_satellite(
         "position": orbit_data.get("position", {})
     }
 
-@app.post("/untrack_satellite/{norad_id}")
-async def untrack_satellite(
+
+
+@app.get("/orbit_track/{norad_id}")
+async def get_orbit_track(
+    request: Request,
     norad_id: str,
-    db: Session = Depends(get_db),
-    auth_token: str = Cookie(None, alias="auth_token")
+    points: int = Query(256, description=f"Points per revolution: {', '.join(map(str, ORBIT_TRACK_LODS))}"),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)
 ):
-    if not auth_token:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+    """One SGP4 revolution in TEME from the start of the current time bucket; unchanged within the bucket"""
+    if points not in ORBIT_TRACK_LODS:
+        raise HTTPException(status_code=400, detail=f"points must be one of {', '.join(map(str, ORBIT_TRACK_LODS))}")
+
+    with timed("db_lookup", 1):
+        satellite = (await db.execute(
+            select(Satellite.tle_line1, Satellite.tle_line2)
+            .where(Satellite.norad_id == norad_id, Satellite.removed_at.is_(None))
+        )).first()
+    if not satellite:
+        raise HTTPException(status_code=404, detail="Satellite not found")
+
+    # Трек меняется с новым TLE или с началом нового шага времени: клиент перерисовывает орбиту,
+    # лишь когда ETag сменился
+    start = track_start()
+    media_type = negotiate(request)[0]
+    etag = entity_tag(*orbit_track_cache.key(satellite.tle_line1, satellite.tle_line2, points, start), media_type)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        meta, xyz = orbit_track_cache.get(satellite.tle_line1, satellite.tle_line2, points, start)
+    except Exception as e:
+        logger.error(f"Error processing orbit track of {norad_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error calculating orbit")
 
-    user = db.query(User).join(AuthToken).filter(
-        AuthToken.token == auth_token,
-        AuthToken.expires_at > datetime.utcnow()
-    ).first()
+    return negotiated_response(request, track_content(meta, xyz), lambda: track_table(xyz), headers)
 
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
 
+@app.get("/orbit_track/cache/stats")
+async def get_orbit_track_cache_stats():
+    """Size and hit rate of the orbit track cache"""
+    return orbit_track_cache.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: request latency, hot-path stages, auth lookups"""
+    content, media_type = render_metrics()
+    return Response(content, media_type=media_type)
+
+
+@app.get("/metrics/slow_requests")
+async def get_slow_requests():
+    """Per-stage breakdown of the latest sampled requests slower than PROFILE_SLOW_MS"""
+    return list(slow_requests)
+
+
+@app.get("/snapshot/stats")
+async def get_snapshot_stats():
+    """Age, build time and memory use of the shared catalog snapshot"""
+    return catalog_snapshot.stats()
+
+
+@app.get("/propagation/stats")
+async def get_propagation_stats():
+    """Workers, chunk size and the last job of the multi-process propagation pool"""
+    return propagation_pool.stats()
+
+@app.websocket("/ws/positions")
+async def positions_stream(
+    websocket: WebSocket,
+    db: AsyncSession = Depends(get_async_db),
+    auth_token: str = Cookie(None, alias="auth_token")
+):
+    """Push positions of subscribed satellites; the client sends {"norad_ids": [...]}"""
+    user_id = await resolve_token(db, auth_token) if auth_token else None
+    # Соединение живёт долго: возвращаем соединение с БД в пул сразу после проверки токена
+    await db.close()
+    if user_id is None:
+        await websocket.close(code=1008)
+        return
+
+    await position_streamer.connect(websocket)
+    try:
+        while True:
+            message = await websocket.receive_json()
+            position_streamer.subscribe(websocket, list(message.get("norad_ids", [])))
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Position stream error: {e}")
+    finally:
+        position_streamer.disconnect(websocket)
+
+@app.post("/untrack_satellite/{norad_id}")
+async def untrack_satellite(
+    norad_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)
+):
     # Удаляем связь пользователя со спутником
-    tracking = db.query(UserSatellite).filter_by(
-        user_id=user.id,
-        norad_id=norad_id
-    ).first()
+    tracking = await db.get(UserSatellite, (user_id, norad_id))
 
     if tracking:
-        db.delete(tracking)
-        db.commit()
+        await db.delete(tracking)
+        await db.commit()
 
     return {"status": f"Stopped tracking satellite {norad_id}"}
 
@@ -0,0 +1,121 @@
+import os
+import time
+import random
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from loguru import logger
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+)
+
+# Доля запросов, для которых собирается разбивка времени по этапам, 0 - профилировщик выключен
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Запросы из выборки дольше порога пишутся в лог вместе с разбивкой
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))
+# Сколько последних медленных запросов отдаёт /metrics/slow_requests
+PROFILE_KEEP = 100
+
+# Этапы от десятков микросекунд (разбор одного TLE) до секунд (загрузка каталога)
+STAGE_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+REQUEST_SECONDS = Histogram(
+    "satellite_http_request_duration_seconds", "HTTP request latency",
+    ["method", "route", "status"], buckets=STAGE_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "satellite_stage_duration_seconds", "Time spent in one hot-path stage",
+    ["stage"], buckets=STAGE_BUCKETS
+)
+STAGE_ITEMS = Counter(
+    "satellite_stage_items_total", "Objects processed by a stage (satellites, TLE rows)", ["stage"]
+)
+AUTH_LOOKUPS = Counter(
+    "satellite_auth_lookups_total", "Auth token lookups by outcome", ["result"]
+)
+SLOW_REQUESTS = Counter(
+    "satellite_slow_requests_total", "Sampled requests slower than PROFILE_SLOW_MS", ["route"]
+)
+
+# Разбивка текущего запроса по этапам: список (этап, секунды) или None, если запрос не в выборке.
+# asyncio.to_thread копирует контекст, поэтому этапы из потоков попадают в тот же список
+_breakdown = ContextVar("request_breakdown", default=None)
+slow_requests = deque(maxlen=PROFILE_KEEP)
+
+
+@contextmanager
+def timed(stage, items=None):
+    """Observe the duration of the block in the stage histogram."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        if items is not None:
+            STAGE_ITEMS.labels(stage).inc(items)
+        breakdown = _breakdown.get()
+        if breakdown is not None:
+            breakdown.append((stage, elapsed))
+
+
+def _route(request):
+    # Шаблон пути, а не сам путь: иначе каждый NORAD ID даёт отдельный ряд метрик
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+async def metrics_middleware(request, call_next):
+    """Time every request; for sampled ones keep the per-stage breakdown and report slow ones."""
+    breakdown = [] if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE else None
+    token = _breakdown.set(breakdown)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        _breakdown.reset(token)
+        route = _route(request)
+        REQUEST_SECONDS.labels(request.method, route, str(status)).observe(elapsed)
+        if breakdown is not None and elapsed * 1000 > PROFILE_SLOW_MS:
+            _report_slow(request, route, status, elapsed, breakdown)
+
+
+def _report_slow(request, route, status, elapsed, breakdown):
+    stages = {}
+    for stage, seconds in breakdown:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+    stages_ms = {stage: round(1000 * seconds, 2) for stage, seconds in stages.items()}
+    record = {
+        "path": request.url.path,
+        "query": request.url.query,
+        "route": route,
+        "status": status,
+        "at": time.time(),
+        "elapsed_ms": round(1000 * elapsed, 2),
+        # Этапы в потоках могут перекрываться, поэтому остаток бывает отрицательным
+        "unaccounted_ms": round(1000 * (elapsed - sum(stages.values())), 2),
+        "stages_ms": stages_ms,
+    }
+    slow_requests.append(record)
+    SLOW_REQUESTS.labels(route).inc()
+    logger.warning(f"Slow request {request.method} {request.url.path}: {record['elapsed_ms']} ms, stages {stages_ms}")
+
+
+def record_auth_lookup(result):
+    AUTH_LOOKUPS.labels(result).inc()
+
+
+def render_metrics():
+    """Prometheus text exposition; merges all workers when PROMETHEUS_MULTIPROC_DIR is set."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, Float, String, DateTime, ForeignKey, Sequence
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
 Base = declarative_base()
 
+# Монотонный номер изменения каталога: каждая вставка, обновление TLE или удаление берёт следующий
+satellite_change_seq = Sequence('satellite_change_seq', schema='satelite')
+
 
 class Satellite(Base):
     __tablename__ = 'satellites'
@@ -15,6 +18,19 @@ class Satellite(Base):
     tle_line1 = Column(String)
     tle_line2 = Column(String)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(BigInteger, satellite_change_seq, index=True)
+    # Спутник пропал из источника TLE; строка остаётся ради отслеживаний и дельта-синхронизации
+    removed_at = Column(DateTime)
+    # Элементы орбиты, извлечённые из TLE при загрузке (TLE.tle_elements), для фильтров в SQL
+    epoch = Column(DateTime, index=True)
+    mean_motion_rev_day = Column(Float)
+    period_min = Column(Float, index=True)
+    semi_major_axis_km = Column(Float)
+    apogee_km = Column(Float, index=True)
+    perigee_km = Column(Float, index=True)
+    inclination_deg = Column(Float, index=True)
+    eccentricity = Column(Float, index=True)
+    raan_deg = Column(Float, index=True)
 
     users = relationship('User', secondary='satelite.user_satellite', back_populates='satellites')
 
@@ -46,7 +62,7 @@ class AuthToken(Base):
     user_id = Column(Integer, ForeignKey('satelite.users.id'))
     token = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime)
+    expires_at = Column(DateTime, index=True)
 
     user = relationship('User', back_populates='tokens')
 
@@ -0,0 +1,119 @@
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from TLE import satellite_cache, SatelliteCache, julian_dates
+from metrics import timed
+
+# Допустимые уровни детализации: число точек на один виток
+ORBIT_TRACK_LODS = (64, 256, 1024)
+ORBIT_TRACK_CACHE_SIZE = int(os.getenv("ORBIT_TRACK_CACHE_SIZE", "5000"))
+# Начало витка округляется вниз до этого шага: трек и его ETag меняются не чаще раза за шаг
+ORBIT_TRACK_BUCKET_S = int(os.getenv("ORBIT_TRACK_BUCKET_S", "600"))
+
+# Юлианская дата 1970-01-01 00:00 UTC: от неё эпоха TLE переводится в datetime
+_JD_UNIX_EPOCH = 2440587.5
+
+
+def track_start(now=None, bucket_s=ORBIT_TRACK_BUCKET_S):
+    """``now`` (UTC) rounded down to a multiple of ``bucket_s``: where served tracks begin."""
+    now = now or datetime.utcnow()
+    elapsed = (now - datetime(1970, 1, 1)).total_seconds()
+    return datetime(1970, 1, 1) + timedelta(seconds=elapsed // bucket_s * bucket_s)
+
+
+def orbit_track(tle_line1, tle_line2, points, start):
+    """One revolution of SGP4 positions in TEME starting at ``start``.
+
+    Starting near the current time rather than at the TLE epoch keeps the
+    drawn track on the satellite for old element sets too: drag shifts a LEO
+    orbit by hundreds of km within days. TEME is quasi-inertial: a client
+    overlays the track on Earth-fixed positions by rotating it about the z
+    axis by minus the current GMST. Returns (metadata, (points, 3) array in
+    km); points SGP4 could not propagate are NaN.
+    """
+    sat, _ = satellite_cache.get(tle_line1, tle_line2)
+    period_s = 2 * np.pi / sat.no_kozai * 60
+    step_s = period_s / points
+    jd, fr = julian_dates([start])
+    offsets_days = np.arange(points) * step_s / 86400
+    with timed("sgp4", points):
+        error, position, _ = sat.sgp4_array(np.full(points, jd[0]), fr[0] + offsets_days)
+    if np.all(error != 0):
+        raise ValueError(f"SGP4 error code {int(error[0])} for satellite {sat.satnum}")
+
+    epoch = datetime(1970, 1, 1) + timedelta(days=(sat.jdsatepoch - _JD_UNIX_EPOCH) + sat.jdsatepochF)
+    meta = {
+        "norad_id": tle_line1[2:7].strip(),
+        "epoch": epoch.isoformat(),
+        "start": start.isoformat(),
+        "frame": "teme",
+        "period_min": period_s / 60,
+        "step_s": step_s,
+        "points": points,
+    }
+    # Точность до метра: для отрисовки этого с запасом хватает, а JSON в разы короче
+    xyz = np.where((error == 0)[:, None], np.round(position, 3), np.nan)
+    return meta, xyz
+
+
+def track_content(meta, xyz):
+    """JSON body of a track: metadata and one list per axis, None for missing points."""
+    return {
+        **meta,
+        **{axis: [v if v == v else None for v in xyz[:, i].tolist()] for i, axis in enumerate("xyz")},
+    }
+
+
+class OrbitTrackCache:
+    """LRU cache of orbit tracks keyed by NORAD ID, TLE epoch, TLE hash, level of detail and start.
+
+    A new element set or the next time bucket gets a new key, so entries
+    never go stale; old ones fall out by LRU order.
+    """
+
+    def __init__(self, max_size=ORBIT_TRACK_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tle_line1, tle_line2, points, start):
+        return (*SatelliteCache.key(tle_line1, tle_line2), points, start.isoformat())
+
+    def get(self, tle_line1, tle_line2, points, start):
+        """Return (metadata, positions) of the track beginning at ``start``, computing it on a miss."""
+        key = self.key(tle_line1, tle_line2, points, start)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = orbit_track(tle_line1, tle_line2, points, start)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+orbit_track_cache = OrbitTrackCache()
@@ -0,0 +1,152 @@
+import numpy as np
+from datetime import timedelta
+from loguru import logger
+
+from TLE import (
+    WGS84_A_KM, WGS84_E2, julian_date_range, propagate_batch, propagate_points, teme_to_itrs_fast
+)
+
+# Сколько спутников прогоняем за один векторизованный вызов грубого поиска
+SCAN_CHUNK_SIZE = 512
+GOLDEN_RATIO = (np.sqrt(5) - 1) / 2
+
+
+def observer_itrs(latitude_deg, longitude_deg, altitude_km):
+    """ITRS position of a WGS84 observer in km and the local zenith unit vector."""
+    lat, lon = np.radians(latitude_deg), np.radians(longitude_deg)
+    n = WGS84_A_KM / np.sqrt(1 - WGS84_E2 * np.sin(lat) ** 2)
+    position = np.array([
+        (n + altitude_km) * np.cos(lat) * np.cos(lon),
+        (n + altitude_km) * np.cos(lat) * np.sin(lon),
+        (n * (1 - WGS84_E2) + altitude_km) * np.sin(lat),
+    ])
+    zenith = np.array([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    return position, zenith
+
+
+def _elevation_deg(itrs_km, observer, zenith):
+    """Elevation above the observer horizon for ITRS positions (..., 3); NaN maps to -90."""
+    line_of_sight = itrs_km - observer
+    sin_elevation = (line_of_sight @ zenith) / np.linalg.norm(line_of_sight, axis=-1)
+    return np.nan_to_num(np.degrees(np.arcsin(sin_elevation)), nan=-90.0)
+
+
+class _PointEvaluator:
+    """Elevation of satellite ``index[k]`` at ``t[k]`` seconds after the window start.
+
+    Points are grouped by satellite so each iteration costs one array-valued
+    SGP4 call per satellite that still has unresolved points.
+    """
+
+    def __init__(self, satrecs, jd0, fr0, observer, zenith):
+        self.satrecs = satrecs
+        self.jd0 = jd0
+        self.fr0 = fr0
+        self.observer = observer
+        self.zenith = zenith
+
+    def __call__(self, index, t):
+        fr = self.fr0 + t / 86400.0
+        jd = np.full(len(t), self.jd0)
+        position, _ = propagate_points(self.satrecs, index, jd, fr)
+        itrs = teme_to_itrs_fast(position, jd, fr)
+        return _elevation_deg(itrs, self.observer, self.zenith)
+
+
+def _bisect_crossings(evaluate, index, lo, hi, rising, min_elevation_deg, tolerance_s):
+    """Refine horizon crossings bracketed by [lo, hi] with vectorized bisection."""
+    while len(lo) and np.max(hi - lo) > tolerance_s:
+        mid = (lo + hi) / 2
+        above = evaluate(index, mid) >= min_elevation_deg
+        # Для восхода граница справа от точки над горизонтом, для захода - наоборот
+        move_hi = above == rising
+        hi = np.where(move_hi, mid, hi)
+        lo = np.where(move_hi, lo, mid)
+    return (lo + hi) / 2
+
+
+def _golden_maximum(evaluate, index, lo, hi, tolerance_s):
+    """Refine the elevation maximum inside [lo, hi] with vectorized golden-section search."""
+    while len(lo) and np.max(hi - lo) > tolerance_s:
+        left = hi - GOLDEN_RATIO * (hi - lo)
+        right = lo + GOLDEN_RATIO * (hi - lo)
+        elevation = evaluate(np.concatenate([index, index]), np.concatenate([left, right]))
+        left_higher = elevation[:len(index)] >= elevation[len(index):]
+        hi = np.where(left_higher, right, hi)
+        lo = np.where(left_higher, lo, left)
+    t = (lo + hi) / 2
+    return t, evaluate(index, t)
+
+
+def predict_passes(satellites, latitude_deg, longitude_deg, altitude_km, start, stop,
+                   min_elevation_deg=10.0, coarse_step_s=60.0, tolerance_s=0.5):
+    """Predict passes of satellites over an observer between start and stop.
+
+    ``satellites`` is a sequence of (norad_id, tle_line1, tle_line2). All
+    satellites are first scanned on a coarse time grid; AOS/LOS are then refined
+    by bisection around elevation sign changes and TCA by golden-section search
+    around the coarse maximum. Passes shorter than ``coarse_step_s`` can be
+    missed. Returns pass dicts sorted by AOS.
+    """
+    observer, zenith = observer_itrs(latitude_deg, longitude_deg, altitude_km)
+    jd, fr = julian_date_range(start, stop, coarse_step_s)
+    grid = np.arange(len(jd)) * coarse_step_s
+    window_s = grid[-1]
+
+    satrecs = []
+    runs = []  # (индекс спутника, первая и последняя точка сетки над горизонтом)
+    elevations = []
+    for chunk_start in range(0, len(satellites), SCAN_CHUNK_SIZE):
+        chunk = satellites[chunk_start:chunk_start + SCAN_CHUNK_SIZE]
+        batch = propagate_batch([(line1, line2) for _, line1, line2 in chunk], jd=jd, fr=fr)
+        satrecs.extend(batch["satrecs"])
+
+        position = np.where((batch["error"] == 0)[..., None], batch["position"], np.nan)
+        elevation = _elevation_deg(teme_to_itrs_fast(position, jd, fr), observer, zenith)
+        above = np.pad(elevation >= min_elevation_deg, ((0, 0), (1, 1))).astype(np.int8)
+        transitions = np.diff(above, axis=1)
+        rows, rises = np.nonzero(transitions == 1)
+        _, sets = np.nonzero(transitions == -1)
+        for row, first, last in zip(rows, rises, sets - 1):
+            runs.append((chunk_start + row, first, last))
+            elevations.append(elevation[row, first:last + 1])
+
+    if not runs:
+        return []
+
+    evaluate = _PointEvaluator(satrecs, jd[0], fr[0], observer, zenith)
+    index, first, last = (np.array(column) for column in zip(*runs))
+
+    # Проход, начавшийся до окна или не закончившийся в нём, обрезаем по границе окна
+    aos_open, los_open = first > 0, last < len(grid) - 1
+    aos = grid[first].astype(float)
+    los = grid[last].astype(float)
+    crossing_index = np.concatenate([index[aos_open], index[los_open]])
+    crossing_lo = np.concatenate([grid[first[aos_open] - 1], grid[last[los_open]]]).astype(float)
+    crossings = _bisect_crossings(
+        evaluate, crossing_index, crossing_lo, crossing_lo + coarse_step_s,
+        np.concatenate([np.ones(aos_open.sum(), bool), np.zeros(los_open.sum(), bool)]),
+        min_elevation_deg, tolerance_s
+    )
+    aos[aos_open] = crossings[:aos_open.sum()]
+    los[los_open] = crossings[aos_open.sum():]
+
+    peak = grid[first + np.array([np.argmax(e) for e in elevations])]
+    tca, max_elevation = _golden_maximum(
+        evaluate, index,
+        np.clip(peak - coarse_step_s, aos, los), np.clip(peak + coarse_step_s, aos, los),
+        tolerance_s
+    )
+
+    passes = []
+    for k in np.argsort(aos, kind="stable"):
+        norad_id = satellites[index[k]][0]
+        passes.append({
+            "norad_id": norad_id,
+            "aos": (start + timedelta(seconds=float(aos[k]))).isoformat(),
+            "tca": (start + timedelta(seconds=float(tca[k]))).isoformat(),
+            "los": (start + timedelta(seconds=float(min(los[k], window_s)))).isoformat(),
+            "max_elevation_deg": float(max_elevation[k]),
+        })
+    logger.debug(f"Predicted {len(passes)} passes for {len(satellites)} satellites")
+    return passes
@@ -0,0 +1,199 @@
+import os
+import time
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory, resource_tracker
+from sgp4.api import Satrec, SatrecArray
+from loguru import logger
+
+from TLE import teme_to_itrs
+
+# Число процессов-воркеров, 0 - пул выключен и пропагация идёт в основном процессе
+PROPAGATION_WORKERS = int(os.getenv("PROPAGATION_WORKERS", "0"))
+# Сколько спутников воркер пропагирует за один вызов SGP4
+PROPAGATION_CHUNK_SIZE = int(os.getenv("PROPAGATION_CHUNK_SIZE", "2000"))
+# spawn безопаснее fork в процессе с потоками (uvicorn, фоновые задачи)
+PROPAGATION_START_METHOD = os.getenv("PROPAGATION_START_METHOD", "spawn")
+
+# Состояние процесса-воркера: его доля каталога, разобранная один раз при загрузке
+_shard = None
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def _load_shard(version, tle_pairs, chunk_size):
+    global _shard
+    satrecs = [Satrec.twoline2rv(line1, line2) for line1, line2 in tle_pairs]
+    _shard = {
+        "version": version,
+        "count": len(satrecs),
+        "chunks": {
+            start: SatrecArray(satrecs[start:start + chunk_size])
+            for start in range(0, len(satrecs), chunk_size)
+        },
+    }
+    return os.getpid()
+
+
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _propagate_chunk(version, outputs, offset, start, jd, fr, geodetic):
+    if _shard is None or _shard["version"] != version:
+        raise RuntimeError(f"Catalog version {version} is not loaded in worker {os.getpid()}")
+
+    started = time.perf_counter()
+    satrecs = _shard["chunks"][start]
+    error, position, velocity = satrecs.sgp4(jd, fr)
+    results = {"error": error, "position": position, "velocity": velocity}
+    if geodetic:
+        results.update(teme_to_itrs(position, jd, fr))
+
+    rows = slice(offset + start, offset + start + len(error))
+    segments = []
+    try:
+        for key, (name, shape, dtype) in outputs.items():
+            shm, array = _attach(name, shape, dtype)
+            segments.append(shm)
+            array[rows] = results[key]
+    finally:
+        for shm in segments:
+            shm.close()
+    return time.perf_counter() - started
+
+
+class PropagationPool:
+    """Shards the catalog across warm worker processes and propagates it in parallel.
+
+    Each worker is a single-process executor, so a shard always goes to the
+    same process: its TLEs are parsed once in load() and stay resident.
+    Results are written by the workers straight into shared memory.
+    """
+
+    def __init__(self, workers=PROPAGATION_WORKERS, chunk_size=PROPAGATION_CHUNK_SIZE,
+                 start_method=PROPAGATION_START_METHOD):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.start_method = start_method
+        self.last_job = None
+        self._executors = []
+        self._shards = []  # (смещение, число спутников) для каждого воркера
+        self._version = 0
+
+    @property
+    def running(self):
+        return bool(self._executors)
+
+    @property
+    def count(self):
+        return sum(count for _, count in self._shards)
+
+    def start(self):
+        """Spawn the workers and wait until every one of them has imported its modules."""
+        if self._executors:
+            return
+        # Общий с воркерами resource tracker: сегменты регистрирует и удаляет только родитель
+        resource_tracker.ensure_running()
+        context = multiprocessing.get_context(self.start_method)
+        self._executors = [
+            ProcessPoolExecutor(max_workers=1, mp_context=context) for _ in range(self.workers)
+        ]
+        pids = [future.result() for future in [executor.submit(_warm_up) for executor in self._executors]]
+        logger.info(f"Propagation pool started: {len(pids)} workers, chunk size {self.chunk_size}")
+
+    def shutdown(self):
+        for executor in self._executors:
+            executor.shutdown(cancel_futures=True)
+        self._executors = []
+        self._shards = []
+
+    def load(self, tle_pairs):
+        """Split the catalog into one contiguous shard per worker and parse it there."""
+        self.start()
+        self._version += 1
+        bounds = np.linspace(0, len(tle_pairs), len(self._executors) + 1).astype(int)
+        self._shards = [(int(lo), int(hi - lo)) for lo, hi in zip(bounds[:-1], bounds[1:])]
+        futures = [
+            executor.submit(_load_shard, self._version, tle_pairs[offset:offset + count], self.chunk_size)
+            for executor, (offset, count) in zip(self._executors, self._shards)
+        ]
+        for future in futures:
+            future.result()
+
+    def propagate(self, jd, fr, geodetic=False):
+        """Propagate the loaded catalog to every (jd, fr) time.
+
+        Returns error (N, M), position and velocity (N, M, 3) in TEME like
+        propagate_batch; with ``geodetic`` also the teme_to_itrs outputs.
+        """
+        if not self._executors:
+            raise RuntimeError("Propagation pool is not started")
+
+        jd, fr = np.asarray(jd, dtype=np.float64), np.asarray(fr, dtype=np.float64)
+        n, m = self.count, len(jd)
+        layout = {
+            "error": ((n, m), np.uint8),
+            "position": ((n, m, 3), np.float64),
+            "velocity": ((n, m, 3), np.float64),
+        }
+        if geodetic:
+            layout.update({
+                "xyz_km": ((n, m, 3), np.float64),
+                "latitude_deg": ((n, m), np.float64),
+                "longitude_deg": ((n, m), np.float64),
+                "altitude_km": ((n, m), np.float64),
+            })
+
+        started = time.perf_counter()
+        segments = {}
+        try:
+            for key, (shape, dtype) in layout.items():
+                size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+                segments[key] = shared_memory.SharedMemory(create=True, size=size)
+            outputs = {
+                key: (segments[key].name, shape, np.dtype(dtype).str) for key, (shape, dtype) in layout.items()
+            }
+
+            futures = [
+                executor.submit(_propagate_chunk, self._version, outputs, offset, start, jd, fr, geodetic)
+                for executor, (offset, count) in zip(self._executors, self._shards)
+                for start in range(0, count, self.chunk_size)
+            ]
+            wait(futures)
+            worker_time = sum(future.result() for future in futures)
+
+            results = {
+                key: np.ndarray(shape, dtype=dtype, buffer=segments[key].buf).copy()
+                for key, (shape, dtype) in layout.items()
+            }
+        finally:
+            for shm in segments.values():
+                shm.close()
+                shm.unlink()
+
+        elapsed = time.perf_counter() - started
+        self.last_job = {
+            "objects": n,
+            "times": m,
+            "chunks": len(futures),
+            "elapsed_s": elapsed,
+            "worker_time_s": worker_time,
+        }
+        return results
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "workers": len(self._executors) or self.workers,
+            "chunk_size": self.chunk_size,
+            "objects": self.count,
+            "last_job": self.last_job,
+        }
+
+
+propagation_pool = PropagationPool()
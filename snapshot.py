@@ -0,0 +1,213 @@
+import os
+import sys
+import time
+import asyncio
+import numpy as np
+from datetime import datetime
+from sgp4.api import SatrecArray
+from loguru import logger
+
+from TLE import julian_dates, satellite_cache, teme_to_itrs
+from catalog import catalog_listeners, catalog_version
+from catalog_store import catalog_store, catalog_columns, CATALOG_STORE_POLL_S
+from propagation import propagation_pool
+from database import SessionLocal
+from models import Satellite
+
+# Период пересчёта снимка в секундах, 0 отключает фоновый пересчёт
+SNAPSHOT_INTERVAL_S = float(os.getenv("SNAPSHOT_INTERVAL_S", "5"))
+
+
+class CatalogSnapshot:
+    """Columnar positions of the whole catalog at one instant, indexed by NORAD ID."""
+
+    def __init__(self, timestamp, norad_ids, names, orbital_parameters, error, frames, velocity,
+                 build_time_s):
+        self.timestamp = timestamp
+        self.norad_ids = norad_ids
+        self.names = names
+        self.orbital_parameters = orbital_parameters
+        self.valid = error == 0
+        self.xyz_km = frames["xyz_km"]
+        self.latitude_deg = frames["latitude_deg"]
+        self.longitude_deg = frames["longitude_deg"]
+        self.altitude_km = frames["altitude_km"]
+        self.velocity_km_s = velocity
+        self.build_time_s = build_time_s
+        self.index = {norad_id: i for i, norad_id in enumerate(norad_ids)}
+
+    def get(self, norad_id):
+        """Satellite entry in the /orbit_data format, or None if it is not in the snapshot."""
+        i = self.index.get(norad_id)
+        if i is None or not self.valid[i]:
+            return None
+
+        x, y, z = self.xyz_km[i].tolist()
+        vx, vy, vz = self.velocity_km_s[i].tolist()
+        return {
+            "norad_id": norad_id,
+            "name": self.names[i],
+            "timestamp": self.timestamp.isoformat(),
+            "orbit_data": {
+                "position": {"x": x, "y": y, "z": z},
+                "velocity_teme_km_s": {"x": vx, "y": vy, "z": vz},
+                "orbital_parameters": dict(self.orbital_parameters[i]),
+                "current_lat_lon_alt": {
+                    "latitude_deg": float(self.latitude_deg[i]),
+                    "longitude_deg": float(self.longitude_deg[i]),
+                    "altitude_km": float(self.altitude_km[i]),
+                }
+            }
+        }
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the snapshot arrays and its ID index."""
+        arrays = (self.valid, self.xyz_km, self.latitude_deg, self.longitude_deg,
+                  self.altitude_km, self.velocity_km_s)
+        return (
+            sum(array.nbytes for array in arrays)
+            + sys.getsizeof(self.index)
+            + sum(sys.getsizeof(norad_id) for norad_id in self.norad_ids)
+        )
+
+
+class SnapshotService:
+    """Propagates the active catalog every ``interval`` seconds into a shared snapshot.
+
+    The parsed catalog is kept between ticks and reloaded from the database
+    only after /fetch_tle reports a change. With the shared catalog store only
+    its writer worker propagates; the other workers map the published snapshot.
+    """
+
+    def __init__(self, interval=SNAPSHOT_INTERVAL_S, store=catalog_store):
+        self.interval = interval
+        self.store = store
+        self.snapshot = None
+        self.ticks = 0
+        self._catalog = None
+        self._catalog_version = None
+        self._catalog_dirty = True
+        self._task = None
+        catalog_listeners.append(self.mark_catalog_changed)
+
+    def mark_catalog_changed(self, counts=None):
+        self._catalog_dirty = True
+
+    def get(self, norad_id):
+        return self.snapshot.get(norad_id) if self.snapshot is not None else None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.store.release()
+
+    async def _run(self):
+        while True:
+            delay = self.interval
+            try:
+                if self.store.enabled and not self.store.try_become_writer():
+                    # Снимок считает воркер-писатель, здесь только отображаем его файл
+                    self.snapshot = self.store.read() or self.snapshot
+                    delay = min(self.interval, CATALOG_STORE_POLL_S)
+                else:
+                    await asyncio.to_thread(self.build)
+            except Exception as e:
+                logger.error(f"Catalog snapshot build failed: {e}")
+            await asyncio.sleep(delay)
+
+    def build(self, timestamp=None):
+        """Propagate the whole catalog to ``timestamp`` (default now) and publish the snapshot."""
+        started = time.perf_counter()
+        if self.store.is_writer and not self._catalog_dirty:
+            # /fetch_tle мог обработать другой воркер: его уведомление сюда не доходит
+            db = SessionLocal()
+            try:
+                self._catalog_dirty = catalog_version(db) != self._catalog_version
+            finally:
+                db.close()
+        if self._catalog_dirty or self._catalog is None:
+            self._load_catalog()
+        catalog = self._catalog
+
+        timestamp = timestamp or datetime.utcnow()
+        jd, fr = julian_dates([timestamp])
+        if propagation_pool.running:
+            # Каталог уже разложен по процессам пула: SGP4 и перевод координат идут параллельно
+            result = propagation_pool.propagate(jd, fr, geodetic=True)
+            error, velocity = result["error"], result["velocity"]
+            frames = {key: result[key] for key in ("xyz_km", "latitude_deg", "longitude_deg", "altitude_km")}
+        else:
+            if catalog["satrecs"] is not None:
+                error, position, velocity = catalog["satrecs"].sgp4(jd, fr)
+            else:
+                error, position, velocity = np.zeros((0, 1)), np.zeros((0, 1, 3)), np.zeros((0, 1, 3))
+            frames = teme_to_itrs(position, jd, fr)
+
+        self.snapshot = CatalogSnapshot(
+            timestamp, catalog["norad_ids"], catalog["names"], catalog["orbital_parameters"],
+            error[:, 0],
+            {key: values[:, 0] for key, values in frames.items()},
+            velocity[:, 0],
+            time.perf_counter() - started,
+        )
+        self.ticks += 1
+        if self.store.is_writer:
+            self.store.publish(catalog["store_columns"], catalog["store_order"], self.snapshot)
+        return self.snapshot
+
+    def _load_catalog(self):
+        self._catalog_dirty = False
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                Satellite.norad_id, Satellite.name, Satellite.tle_line1, Satellite.tle_line2
+            ).filter(Satellite.removed_at.is_(None)).all()
+            self._catalog_version = catalog_version(db)
+        finally:
+            db.close()
+
+        entries = [satellite_cache.get(row.tle_line1, row.tle_line2) for row in rows]
+        tle_pairs = [(row.tle_line1, row.tle_line2) for row in rows]
+        if propagation_pool.running:
+            propagation_pool.load(tle_pairs)
+        self._catalog = {
+            "norad_ids": [row.norad_id for row in rows],
+            "names": [row.name for row in rows],
+            "orbital_parameters": [params for _, params in entries],
+            "satrecs": SatrecArray([sat for sat, _ in entries]) if entries else None,
+        }
+        if self.store.enabled:
+            self._catalog["store_columns"], self._catalog["store_order"] = catalog_columns(
+                self._catalog["norad_ids"], self._catalog["names"], tle_pairs, entries
+            )
+        logger.info(f"Catalog snapshot loaded {len(rows)} satellites")
+
+    def stats(self):
+        snapshot = self.snapshot
+        store = self.store.stats() if self.store.enabled else None
+        if snapshot is None:
+            return {"ready": False, "interval_s": self.interval, "ticks": self.ticks, "store": store}
+        return {
+            "ready": True,
+            "store": store,
+            "interval_s": self.interval,
+            "ticks": self.ticks,
+            "objects": len(snapshot.norad_ids),
+            "timestamp": snapshot.timestamp.isoformat(),
+            "age_s": (datetime.utcnow() - snapshot.timestamp).total_seconds(),
+            "build_time_s": snapshot.build_time_s,
+            "memory_bytes": snapshot.nbytes,
+        }
+
+
+catalog_snapshot = SnapshotService()
@@ -0,0 +1,109 @@
+import os
+import asyncio
+from datetime import datetime
+from fastapi import WebSocket
+from loguru import logger
+
+from TLE import get_orbits_and_positions
+from database import SessionLocal
+from models import Satellite
+from snapshot import catalog_snapshot
+
+STREAM_INTERVAL_S = float(os.getenv("STREAM_INTERVAL_S", "5"))
+# Ограничение на число спутников в подписке одного клиента
+STREAM_MAX_SUBSCRIPTION = int(os.getenv("STREAM_MAX_SUBSCRIPTION", "500"))
+
+
+class PositionStreamer:
+    """Pushes satellite positions to WebSocket subscribers.
+
+    Every tick the union of all subscriptions is propagated once and each
+    client receives its own subset, however many clients watch a satellite.
+    """
+
+    def __init__(self, interval=STREAM_INTERVAL_S):
+        self.interval = interval
+        self.ticks = 0
+        self._subscriptions = {}
+        self._wake = asyncio.Event()
+        self._task = None
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        self._subscriptions[websocket] = set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def subscribe(self, websocket: WebSocket, norad_ids):
+        """Replace the client's subscription and push positions without waiting for the tick."""
+        self._subscriptions[websocket] = set(map(str, norad_ids[:STREAM_MAX_SUBSCRIPTION]))
+        self._wake.set()
+
+    def disconnect(self, websocket: WebSocket):
+        self._subscriptions.pop(websocket, None)
+
+    async def _run(self):
+        while self._subscriptions:
+            try:
+                await self._tick()
+            except Exception as e:
+                logger.error(f"Position stream tick failed: {e}")
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _tick(self):
+        norad_ids = set().union(*self._subscriptions.values())
+        if not norad_ids:
+            return
+
+        timestamp = datetime.utcnow()
+        positions = await asyncio.to_thread(self._compute, norad_ids, timestamp)
+        self.ticks += 1
+
+        clients = list(self._subscriptions.items())
+        results = await asyncio.gather(*(
+            websocket.send_json({
+                "type": "positions",
+                "timestamp": timestamp.isoformat(),
+                "satellites": [positions[n] for n in subscription if n in positions],
+            })
+            for websocket, subscription in clients
+        ), return_exceptions=True)
+
+        for (websocket, _), result in zip(clients, results):
+            if isinstance(result, Exception):
+                self.disconnect(websocket)
+
+    @staticmethod
+    def _compute(norad_ids, timestamp):
+        # Спутники из общего снимка каталога не пересчитываем
+        positions = {}
+        for norad_id in norad_ids:
+            entry = catalog_snapshot.get(norad_id)
+            if entry:
+                positions[norad_id] = entry
+        missing = norad_ids - positions.keys()
+        if not missing:
+            return positions
+
+        db = SessionLocal()
+        try:
+            satellites = db.query(Satellite.norad_id, Satellite.name, Satellite.tle_line1, Satellite.tle_line2) \
+                .filter(Satellite.norad_id.in_(missing), Satellite.removed_at.is_(None)).all()
+        finally:
+            db.close()
+
+        orbits = get_orbits_and_positions([(sat.tle_line1, sat.tle_line2) for sat in satellites], timestamp)
+        positions.update({
+            sat.norad_id: {"norad_id": sat.norad_id, "name": sat.name, "orbit_data": orbit_data}
+            for sat, orbit_data in zip(satellites, orbits)
+            if orbit_data is not None
+        })
+        return positions
+
+
+position_streamer = PositionStreamer()
@@ -0,0 +1,19 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from astropy.utils import iers
+
+# Тесты идут без сети: берём таблицу IERS из astropy-iers-data и не пытаемся её обновить
+iers.conf.auto_download = False
+iers.conf.auto_max_age = None
+
+ISS = (
+    "1 25544U 98067A   25190.50000000  .00016717  00000-0  10270-3 0  9993",
+    "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391563537",
+)
+GPS = (
+    "1 24876U 97035A   25190.25000000 -.00000019  00000-0  00000+0 0  9990",
+    "2 24876  55.4470 123.1234 0052345  51.2345 309.1234  2.00563540203456",
+)
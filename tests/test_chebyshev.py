@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from TLE import get_ephemeris
+from chebyshev import ChebyshevEphemeris, EPHEMERIS_CACHE_MAX_ERROR_KM
+from conftest import ISS, GPS
+
+NOW = datetime(2025, 7, 10, 12, 7)
+
+
+def _fitted():
+    ephemeris = ChebyshevEphemeris(window_hours=2, segment_min=30, degree=11,
+                                   max_error_km=EPHEMERIS_CACHE_MAX_ERROR_KM)
+    ephemeris.fit(["25544", "24876"], [ISS, GPS], NOW)
+    return ephemeris
+
+
+def test_cached_points_match_sgp4():
+    ephemeris = _fitted()
+    start = ephemeris.window_start + timedelta(seconds=17)
+    stop = ephemeris.window_stop - timedelta(seconds=1)
+    step_s = 37
+    offsets = np.arange(int((stop - start).total_seconds() // step_s) + 1) * step_s
+
+    positions, served = ephemeris.evaluate(["25544", "24876"], [ISS, GPS], start, offsets)
+    exact = get_ephemeris([ISS, GPS], start, stop, step_s)
+
+    assert served.all()
+    error = np.linalg.norm(positions["xyz_km"] - exact["xyz_km"], axis=-1)
+    assert error.max() <= EPHEMERIS_CACHE_MAX_ERROR_KM
+
+
+def test_changed_tle_and_times_outside_window_are_not_served():
+    ephemeris = _fitted()
+    newer_iss = (ISS[0].replace("25190.50000000", "25190.60000000"), ISS[1])
+    _, served = ephemeris.evaluate(["25544", "24876"], [newer_iss, GPS], ephemeris.window_start, [0.0, 60.0])
+    assert served.tolist() == [False, True]
+
+    positions, served = ephemeris.evaluate(["25544"], [ISS], ephemeris.window_stop, [0.0, 60.0])
+    assert positions is None and not served.any()
+
+
+def test_refit_publishes_a_new_state_and_keeps_the_old_one_intact():
+    ephemeris = _fitted()
+    before = ephemeris.state
+    ephemeris.fit(["24876"], [GPS], NOW)
+
+    # Читатель, взявший старое состояние, дочитывает его согласованным
+    assert ephemeris.state is not before
+    assert before.index == {"25544": 0, "24876": 1} and len(before.tle) == 2
+    assert ephemeris.state.index == {"24876": 0}
+    # GPS с тем же TLE и окном не пересчитывается
+    assert ephemeris.state.refitted == 0
+    np.testing.assert_array_equal(ephemeris.state.coefficients[0], before.coefficients[1])
+
+
+def test_sample_count_matches_the_grid():
+    from TLE import julian_date_range, sample_count
+    start = datetime(2025, 7, 10)
+    # 1 // 0.1 == 9, а сетка строится через floor(1 / 0.1) == 10
+    assert sample_count(start, start + timedelta(seconds=1), 0.1) == 11
+    assert len(julian_date_range(start, start + timedelta(seconds=1), 0.1)[0]) == 11
@@ -0,0 +1,66 @@
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from conjunction import ScreeningJobs, _grid_pairs, screen_conjunctions
+from conftest import ISS, GPS
+
+
+def _checksum(line):
+    return str(sum(int(c) if c.isdigit() else (1 if c == "-" else 0) for c in line[:68]) % 10)
+
+
+def _decayed_tle(norad_id):
+    # 17.5 витка в сутки - большая полуось меньше радиуса Земли, SGP4 возвращает ошибку
+    line1 = f"1 {norad_id}U 20001A   25190.50000000  .00000000  00000-0  00000-0 0  999"
+    line2 = f"2 {norad_id}  51.6000 100.0000 0001000  90.0000 270.0000 17.50000000    1"
+    return line1 + _checksum(line1), line2 + _checksum(line2)
+
+
+def test_grid_pairs_without_positions():
+    i, j = _grid_pairs(np.empty((0, 3)), 10.0)
+    assert len(i) == 0 and len(j) == 0
+
+
+def test_grid_pairs_finds_neighbours():
+    position = np.array([[0.0, 0.0, 0.0], [5.0, 0.0, 0.0], [500.0, 0.0, 0.0]])
+    i, j = _grid_pairs(position, 10.0)
+    assert list(zip(i.tolist(), j.tolist())) == [(0, 1)]
+
+
+def test_screening_empty_catalog():
+    conjunctions, stats = screen_conjunctions([], datetime(2025, 7, 10), window_hours=0.1)
+    assert conjunctions == []
+    assert stats["objects"] == 0
+
+
+def test_screening_when_every_object_fails_propagation():
+    satellites = [(norad_id, *_decayed_tle(norad_id)) for norad_id in ("90001", "90002")]
+    conjunctions, stats = screen_conjunctions(satellites, datetime(2025, 7, 10), window_hours=0.1)
+    assert conjunctions == []
+    assert stats["encounters"] == 0
+
+
+def test_screening_same_orbit_is_a_conjunction():
+    satellites = [("25544", *ISS), ("99999", *ISS), ("24876", *GPS)]
+    conjunctions, _ = screen_conjunctions(satellites, datetime(2025, 7, 10), window_hours=0.1)
+    assert [(c["norad_id_1"], c["norad_id_2"]) for c in conjunctions] == [("25544", "99999")]
+    assert conjunctions[0]["miss_distance_km"] < 1e-6
+
+
+def test_screening_jobs_reject_past_max_pending():
+    jobs = ScreeningJobs(max_pending=1)
+    release = threading.Event()
+    # Занимаем единственный поток исполнителя, чтобы задание осталось в очереди
+    blocker = jobs._executor.submit(release.wait)
+    try:
+        first = jobs.submit([], datetime(2025, 7, 10), 1, 30, 5)
+        assert first is not None and jobs.full()
+        assert jobs.submit([], datetime(2025, 7, 10), 1, 30, 5) is None
+    finally:
+        release.set()
+    blocker.result()
+    jobs._executor.submit(lambda: None).result()
+    assert jobs.get(first)["status"] == "done" and not jobs.full()
+    assert jobs.submit([], datetime(2025, 7, 10), 1, 30, 5) is not None
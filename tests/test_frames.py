@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from TLE import FAST_FRAMES_MAX_ERROR_KM, fast_frames_error_km, _earth_orientation_table
+from conftest import ISS, GPS
+
+
+def _table_end():
+    mjd = _earth_orientation_table()[0]
+    return datetime(1858, 11, 17) + timedelta(days=float(mjd[-1]))
+
+
+def test_fast_frames_within_bound_inside_iers_table():
+    times = [datetime(2025, 7, 10) + timedelta(hours=h) for h in range(0, 48, 6)]
+    assert fast_frames_error_km([ISS, GPS], times) <= FAST_FRAMES_MAX_ERROR_KM
+
+
+@pytest.mark.parametrize("days", [0, 1, 30, 200])
+def test_fast_frames_within_bound_past_iers_table(days):
+    # GPS не тормозится атмосферой, поэтому SGP4 считает его и через год после эпохи
+    end = _table_end()
+    times = [end + timedelta(days=days, hours=h) for h in (0, 5, 11, 17)]
+    assert fast_frames_error_km([GPS], times) <= FAST_FRAMES_MAX_ERROR_KM
+
+
+def test_fast_frames_within_bound_on_last_table_row():
+    assert fast_frames_error_km([GPS], [_table_end()]) <= FAST_FRAMES_MAX_ERROR_KM
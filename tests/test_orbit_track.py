@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from TLE import julian_dates, satellite_cache
+from formats import pack, unpack, track_table
+from orbit_track import OrbitTrackCache, orbit_track, track_start
+from conftest import ISS
+
+# Эпоха TLE из conftest - 2025-07-09 12:00 UTC
+EPOCH = datetime(2025, 7, 9, 12)
+
+
+def _sgp4(start):
+    sat, _ = satellite_cache.get(*ISS)
+    jd, fr = julian_dates([start])
+    error, position, _ = sat.sgp4(jd[0], fr[0])
+    assert error == 0
+    return np.array(position)
+
+
+def test_track_start_is_rounded_down_to_the_bucket():
+    assert track_start(datetime(2025, 7, 12, 13, 27, 41), bucket_s=600) == datetime(2025, 7, 12, 13, 20)
+    assert track_start(datetime(2025, 7, 12, 13, 20), bucket_s=600) == datetime(2025, 7, 12, 13, 20)
+
+
+def test_track_of_an_old_tle_starts_at_the_requested_time():
+    start = track_start(EPOCH + timedelta(days=3, minutes=7))
+    meta, xyz = orbit_track(*ISS, 256, start)
+
+    assert meta["start"] == start.isoformat() and meta["epoch"] == EPOCH.isoformat()
+    assert np.linalg.norm(xyz[0] - _sgp4(start)) < 0.001
+    # Виток от эпохи TLE через трое суток разошёлся бы с положением спутника на сотни км
+    from_epoch = orbit_track(*ISS, 256, EPOCH)[1]
+    assert np.nanmin(np.linalg.norm(from_epoch - _sgp4(start), axis=1)) > 50
+
+
+def test_cache_key_changes_with_the_bucket():
+    cache = OrbitTrackCache(max_size=10)
+    start = datetime(2025, 7, 12, 13, 20)
+    later = start + timedelta(minutes=10)
+    assert cache.key(*ISS, 256, start) != cache.key(*ISS, 256, later)
+
+    cache.get(*ISS, 256, start)
+    cache.get(*ISS, 256, start)
+    cache.get(*ISS, 256, later)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_track_packs_without_labels():
+    _, xyz = orbit_track(*ISS, 64, datetime(2025, 7, 12, 13, 20))
+    labels, columns = unpack(pack(*track_table(xyz), np.dtype("<f4")))
+    assert labels == []
+    np.testing.assert_allclose(np.column_stack([columns[axis] for axis in "xyz"]), xyz, rtol=1e-6)
@@ -0,0 +1,38 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from ayth import PasswordHasher
+
+
+def test_cancelled_request_keeps_its_slot_until_bcrypt_finishes():
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    release = threading.Event()
+
+    async def scenario():
+        task = asyncio.create_task(hasher._submit(release.wait))
+        await asyncio.sleep(0.05)
+        # Клиент отключился: ожидание отменено, но расчёт в пуле ещё идёт
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert hasher.stats()["pending"] == 1
+        with pytest.raises(HTTPException) as busy:
+            await hasher._submit(lambda: None)
+        assert busy.value.status_code == 503
+
+        release.set()
+        for _ in range(100):
+            if hasher.stats()["pending"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert hasher.stats()["pending"] == 0
+        assert await hasher._submit(lambda: "done") == "done"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        # Иначе при упавшей проверке поток пула остался бы занят и pytest не завершился бы
+        release.set()
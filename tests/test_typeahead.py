@@ -0,0 +1,76 @@
+from typeahead import TypeaheadIndex
+
+CATALOG = {
+    "25544": "ISS (ZARYA)",
+    "25545": "ISS DEB",
+    "27424": "AQUA",
+    "25994": "TERRA",
+    "31698": "TERRASAR-X",
+    "40001": "SAT TERRA",
+    "40002": "MINITERRA",
+    "34427": "COSMOS 2251 DEB",
+    "44713": "STARLINK-1007",
+    "33591": "NOAA 19",
+}
+
+
+def _index():
+    index = TypeaheadIndex(check_s=0)
+    index.build(list(CATALOG), list(CATALOG.values()), version=7)
+    return index
+
+
+def _found(index, query, limit=10):
+    return [(row["norad_id"], row["match"]) for row in index.search(query, limit)]
+
+
+def test_search_before_build_is_empty():
+    index = TypeaheadIndex(check_s=0)
+    assert not index.ready
+    assert index.search("iss") == []
+    assert index.stats()["ready"] is False
+
+
+def test_match_kinds_are_ranked():
+    index = _index()
+    assert _found(index, "terra") == [
+        ("25994", "name"),
+        ("31698", "name_prefix"),
+        ("40001", "word_prefix"),
+        ("40002", "substring"),
+    ]
+
+
+def test_norad_id_matches_come_first():
+    index = _index()
+    assert _found(index, "25544")[0] == ("25544", "id")
+    assert _found(index, "2554") == [("25544", "id_prefix"), ("25545", "id_prefix")]
+
+
+def test_later_words_substrings_and_typos():
+    index = _index()
+    assert _found(index, "2251") == [("34427", "word_prefix")]
+    assert ("25545", "word_prefix") in _found(index, "deb")
+    assert _found(index, "link") == [("44713", "substring")]
+    assert _found(index, "starlimk") == [("44713", "similar")]
+    assert _found(index, "noaa 19") == [("33591", "name")]
+
+
+def test_limit_and_case():
+    index = _index()
+    assert len(index.search("TERRA", limit=2)) == 2
+    # Совпадения по префиксу идут в порядке ключей: "iss (zarya)" < "iss deb"
+    assert index.search("  ISS  ", limit=1) == [{"norad_id": "25544", "name": "ISS (ZARYA)", "match": "name_prefix"}]
+
+
+def test_rebuild_swaps_the_whole_snapshot():
+    index = _index()
+    before = index.snapshot
+    index.build(["25544"], ["ISS (ZARYA)"], version=8)
+
+    # Поиск, взявший старый снимок, дочитывает его согласованным
+    assert index.snapshot is not before
+    assert len(before.norad_ids) == len(CATALOG) and before.version == 7
+    assert index.version == 8
+    assert _found(index, "terra") == []
+    assert index.stats()["objects"] == 1
@@ -0,0 +1,287 @@
+import os
+import time
+import asyncio
+import bisect
+import numpy as np
+from dataclasses import dataclass
+from loguru import logger
+from sqlalchemy import or_, func
+
+from catalog import catalog_listeners, catalog_version
+from database import SessionLocal
+from models import Satellite
+
+# Как часто фоновая задача сверяет версию каталога (его мог обновить другой воркер), 0 - индекс выключен
+TYPEAHEAD_CHECK_S = float(os.getenv("TYPEAHEAD_CHECK_S", "10"))
+# Порог сходства по триграммам для нечёткого совпадения, как pg_trgm.word_similarity_threshold
+TYPEAHEAD_MIN_SIMILARITY = float(os.getenv("TYPEAHEAD_MIN_SIMILARITY", "0.6"))
+
+def trigrams(text):
+    """Trigrams of a lowercased string padded like pg_trgm: two spaces before, one after."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _prefix_range(keys, prefix, key=None):
+    """Slice of the sorted ``keys`` that start with ``prefix``."""
+    low = bisect.bisect_left(keys, prefix, key=key)
+    high = bisect.bisect_left(keys, prefix + "\uffff", low, key=key)
+    return low, high
+
+
+def typeahead_query(db, query, limit=10):
+    """Database fallback of TypeaheadIndex.search while the index is not built yet.
+
+    Scans the catalog with LIKE, so it is slow on a large catalog; ranks by
+    the same match kinds except similar.
+    """
+    query = query.strip().lower()
+    if not query:
+        return []
+    pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    rows = db.query(Satellite.norad_id, Satellite.name).filter(
+        Satellite.removed_at.is_(None),
+        or_(Satellite.norad_id.like(pattern[1:], escape="\\"), func.lower(Satellite.name).like(pattern, escape="\\"))
+    ).limit(limit * 20).all()
+
+    def match(row):
+        name = (row.name or "").lower()
+        if row.norad_id == query:
+            return "id"
+        if row.norad_id.startswith(query):
+            return "id_prefix"
+        if name == query:
+            return "name"
+        if name.startswith(query):
+            return "name_prefix"
+        return "substring" if name[name.find(query) - 1].isalnum() else "word_prefix"
+
+    kinds = ("id", "id_prefix", "name", "name_prefix", "word_prefix", "substring")
+    matches = [(match(row), row) for row in rows]
+    matches.sort(key=lambda item: (kinds.index(item[0]), len(item[1].name or ""), item[1].name or ""))
+    return [{"norad_id": row.norad_id, "name": row.name, "match": kind} for kind, row in matches[:limit]]
+
+
+@dataclass(frozen=True)
+class TypeaheadSnapshot:
+    """One built index: what search reads, published as a whole.
+
+    Rows are numbered by name length; ``id_rows`` and ``name_rows`` list
+    them in the order of ``id_keys`` and ``name_keys``, ``word_starts`` holds
+    (row, offset) of later words sorted by the rest of the name, and
+    ``postings`` maps a trigram to its rows.
+    """
+
+    norad_ids: list
+    names: list
+    keys: list
+    id_keys: list
+    id_rows: list
+    name_keys: list
+    name_rows: list
+    word_starts: list
+    postings: dict
+    version: int = None
+    build_time_s: float = None
+
+
+class TypeaheadIndex:
+    """In-process search index over satellite names and NORAD IDs.
+
+    Prefix matches of the NORAD ID, the name and every later word of the name
+    come from sorted key lists (bisect), substring and fuzzy matches from
+    trigram posting lists. The index is rebuilt in the
+    background after /fetch_tle and whenever catalog_version moves.
+    """
+
+    def __init__(self, check_s=TYPEAHEAD_CHECK_S, min_similarity=TYPEAHEAD_MIN_SIMILARITY):
+        self.check_s = check_s
+        self.min_similarity = min_similarity
+        # Построенный индекс, None до первой сборки; заменяется только целиком
+        self.snapshot = None
+        self._catalog_dirty = True
+        self._task = None
+        catalog_listeners.append(self.mark_catalog_changed)
+
+    def mark_catalog_changed(self, counts=None):
+        self._catalog_dirty = True
+
+    @property
+    def ready(self):
+        return self.snapshot is not None
+
+    @property
+    def version(self):
+        snapshot = self.snapshot
+        return snapshot.version if snapshot is not None else None
+
+    def start(self):
+        if self.check_s > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error(f"Typeahead index rebuild failed: {e}")
+            await asyncio.sleep(self.check_s)
+
+    def refresh(self):
+        """Reload the catalog from the database if it changed since the last build."""
+        db = SessionLocal()
+        try:
+            version = catalog_version(db)
+            if not self._catalog_dirty and version == self.version:
+                return False
+            self._catalog_dirty = False
+            rows = db.query(Satellite.norad_id, Satellite.name).filter(Satellite.removed_at.is_(None)).all()
+        finally:
+            db.close()
+        snapshot = self.build([row.norad_id for row in rows], [row.name or "" for row in rows], version)
+        logger.info(f"Typeahead index built for {len(rows)} satellites in {snapshot.build_time_s:.2f} s")
+        return True
+
+    def build(self, norad_ids, names, version=None):
+        """Index ``names`` and ``norad_ids`` and publish the result; returns the new snapshot."""
+        started = time.perf_counter()
+        # Строки нумеруются по длине названия: списки триграмм тогда сразу упорядочены
+        # от коротких названий к длинным, и поиск подстроки может остановиться на limit
+        order = sorted(range(len(names)), key=lambda i: (len(names[i]), names[i].lower()))
+        norad_ids = [norad_ids[i] for i in order]
+        names = [names[i] for i in order]
+        keys = [name.lower() for name in names]
+        id_order = sorted(range(len(norad_ids)), key=norad_ids.__getitem__)
+        name_order = sorted(range(len(keys)), key=keys.__getitem__)
+
+        postings, word_starts = {}, []
+        for row, key in enumerate(keys):
+            for gram in trigrams(key):
+                postings.setdefault(gram, []).append(row)
+            # Начала следующих слов: "cosmos 2251 deb" находится по "2251" и "deb"
+            word_starts.extend(
+                (row, i) for i in range(1, len(key)) if key[i].isalnum() and not key[i - 1].isalnum()
+            )
+        word_starts.sort(key=lambda start: keys[start[0]][start[1]:])
+
+        snapshot = TypeaheadSnapshot(
+            norad_ids=norad_ids,
+            names=names,
+            keys=keys,
+            id_keys=[norad_ids[row] for row in id_order],
+            id_rows=id_order,
+            name_keys=[keys[row] for row in name_order],
+            name_rows=name_order,
+            word_starts=word_starts,
+            postings={gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()},
+            version=version,
+            build_time_s=time.perf_counter() - started,
+        )
+        # Индекс публикуется одним присваиванием: поиск в другом потоке берёт
+        # либо старый снимок целиком, либо новый, но не их смесь
+        self.snapshot = snapshot
+        return snapshot
+
+    def search(self, query, limit=10):
+        """Up to ``limit`` satellites matching ``query``, best first.
+
+        Every result carries its ``match`` kind, in rank order: id (exact NORAD
+        ID), id_prefix, name (exact), name_prefix, word_prefix (a later word of
+        the name), substring, similar (trigram similarity). Prefix matches are
+        in key order, the others shorter names first.
+        """
+        index = self.snapshot
+        query = query.strip().lower()
+        if index is None or not query or limit <= 0:
+            return []
+        found = {}
+
+        def add(rows, kind):
+            for row in rows:
+                if len(found) >= limit:
+                    return
+                found.setdefault(row, kind)
+
+        if query.isdigit():
+            low, high = _prefix_range(index.id_keys, query)
+            # Ключи отсортированы как строки: точное совпадение, если оно есть, стоит первым
+            if low < high and index.id_keys[low] == query:
+                add(index.id_rows[low:low + 1], "id")
+            add(index.id_rows[low:min(high, low + limit)], "id_prefix")
+
+        if len(found) < limit:
+            low, high = _prefix_range(index.name_keys, query)
+            if low < high and index.name_keys[low] == query:
+                add(index.name_rows[low:low + 1], "name")
+            add(index.name_rows[low:min(high, low + limit)], "name_prefix")
+
+        if len(found) < limit:
+            keys = index.keys
+            low, high = _prefix_range(index.word_starts, query, key=lambda start: keys[start[0]][start[1]:])
+            # Одно название может начинать несколько слов с запроса: берём с запасом
+            add((row for row, _ in index.word_starts[low:min(high, low + 2 * limit)]), "word_prefix")
+
+        if len(found) < limit and len(query) >= 3:
+            self._substring_matches(index, query, found, add)
+
+        if len(found) < limit and len(query) >= 3:
+            self._similar_matches(index, query, found, limit, add)
+
+        return [
+            {"norad_id": index.norad_ids[row], "name": index.names[row], "match": kind}
+            for row, kind in found.items()
+        ]
+
+    def _substring_matches(self, index, query, found, add):
+        # Подстрока содержит все свои триграммы без выравнивания: пересекаем их списки от короткого
+        grams = {query[i:i + 3] for i in range(len(query) - 2)}
+        lists = sorted((index.postings.get(gram) for gram in grams), key=lambda rows: 0 if rows is None else len(rows))
+        if lists[0] is None:
+            return
+        candidates = lists[0]
+        for rows in lists[1:]:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        # Триграммы могут встретиться и врозь, поэтому кандидата проверяем; совпадения в начале
+        # названия или слова уже найдены выше, так что остаются вхождения внутри слова
+        keys = index.keys
+        add((row for row in candidates.tolist() if row not in found and query in keys[row]), "substring")
+
+    def _similar_matches(self, index, query, found, limit, add):
+        grams = trigrams(query)
+        lists = [index.postings[gram] for gram in grams if gram in index.postings]
+        if not lists:
+            return
+        # Доля триграмм запроса, найденных в названии, как pg_trgm.word_similarity:
+        # опечатка в начале длинного названия не тонет в его остальных триграммах
+        shared = np.bincount(np.concatenate(lists), minlength=len(index.keys))
+        candidates = np.flatnonzero(shared >= self.min_similarity * len(grams))
+        # Больше общих триграмм, при равенстве короче название (строки упорядочены по длине)
+        best = candidates[np.argsort(-shared[candidates], kind="stable")[:limit + len(found)]]
+        add((row for row in best.tolist() if row not in found), "similar")
+
+    def stats(self):
+        index = self.snapshot
+        if index is None:
+            return {"ready": False, "objects": 0, "trigrams": 0, "catalog_version": None,
+                    "build_time_s": None, "word_starts": 0, "postings_bytes": 0}
+        return {
+            "ready": True,
+            "objects": len(index.norad_ids),
+            "trigrams": len(index.postings),
+            "catalog_version": index.version,
+            "build_time_s": index.build_time_s,
+            "word_starts": len(index.word_starts),
+            "postings_bytes": int(sum(rows.nbytes for rows in index.postings.values())),
+        }
+
+
+typeahead_index = TypeaheadIndex()